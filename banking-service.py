@@ -16,6 +16,7 @@ from config import (
     CONSENT_STORE_INTERNAL_URL,
     BANKING_SERVICE_PORT
 )
+import instrumentation
 
 app = FastAPI(
     title="Banking Service",
@@ -32,6 +33,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request and downstream call metrics at /metrics
+instrumentation.instrument(app)
+
 # Security scheme
 security = HTTPBearer()
 
@@ -45,12 +49,16 @@ async def get_keycloak_public_key():
     try:
         async with httpx.AsyncClient() as client:
             # Get realm info
-            response = await client.get(f"{KEYCLOAK_URL}/realms/{REALM}")
+            with instrumentation.downstream("keycloak_realm") as call:
+                response = await client.get(f"{KEYCLOAK_URL}/realms/{REALM}")
+                call.status = response.status_code
             response.raise_for_status()
             realm_info = response.json()
             
             # Get certificates
-            certs_response = await client.get(f"{KEYCLOAK_URL}/realms/{REALM}/protocol/openid-connect/certs")
+            with instrumentation.downstream("keycloak_certs") as call:
+                certs_response = await client.get(f"{KEYCLOAK_URL}/realms/{REALM}/protocol/openid-connect/certs")
+                call.status = certs_response.status_code
             certs_response.raise_for_status()
             
             return certs_response.json()
@@ -242,10 +250,12 @@ async def consent_decision(
                 
                 # Save consent to consent store
                 print(f"Saving consent: {consent_data}")
-                response = await client.post(
-                    f"{CONSENT_STORE_INTERNAL_URL}/consent",
-                    json=consent_data
-                )
+                with instrumentation.downstream("consent_grant") as call:
+                    response = await client.post(
+                        f"{CONSENT_STORE_INTERNAL_URL}/consent",
+                        json=consent_data
+                    )
+                    call.status = response.status_code
                 
                 print(f"Consent store response: {response.status_code} - {response.text}")
                 
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the consent-store hot paths.
+
+Drives a mixed workload (by default 95% POST /consent/check, the rest split
+between grants and single-capability revokes) from concurrent async workers,
+either against consent-store loaded in-process or against a running instance,
+and prints a JSON report with throughput and latency percentiles per operation.
+
+    python benchmarks/consent_load.py --concurrency 64 --duration 20
+    python benchmarks/consent_load.py --url http://localhost:8001 --output run.json
+
+consent-store settings (CONSENT_STORE_* environment variables) apply to the
+in-process app as usual, so configurations can be compared run by run.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 95, 99)
+
+def load_app(data_dir: str):
+    """Import consent-store with its database files in data_dir"""
+    os.makedirs(data_dir, exist_ok=True)
+    os.chdir(data_dir)
+    sys.path.insert(0, REPO_ROOT)
+    sys.path.insert(0, os.path.join(REPO_ROOT, "consent-store"))
+    import consent_store
+    return consent_store.app
+
+def app_name(index: int) -> str:
+    return f"bench-app-{index}"
+
+def capability_name(index: int) -> str:
+    return f"cap-{index}"
+
+class Dataset:
+    """Names the benchmark uses; consents are drawn from the same space so most checks hit"""
+
+    def __init__(self, users: int, apps: int, capabilities: int, seed: int):
+        self.users = users
+        self.apps = apps
+        self.capabilities = capabilities
+        self.random = random.Random(seed)
+        # Consents granted during the run, so revokes mostly remove something
+        self.granted = deque(maxlen=100000)
+
+    def user(self) -> str:
+        return f"bench-user-{self.random.randrange(self.users)}"
+
+    def pair(self):
+        requesting, destination = self.random.sample(range(self.apps), 2)
+        return app_name(requesting), app_name(destination)
+
+    def capability_list(self, most: int = 3) -> List[str]:
+        count = self.random.randint(1, min(most, self.capabilities))
+        return [capability_name(i) for i in self.random.sample(range(self.capabilities), count)]
+
+async def seed(client: httpx.AsyncClient, dataset: Dataset, consents_per_user: int):
+    """Register applications and capabilities, then bulk-import the initial consents"""
+    for i in range(dataset.apps):
+        response = await client.post("/applications", json={"name": app_name(i)})
+        if response.status_code not in (200, 409):
+            raise RuntimeError(f"Creating {app_name(i)} failed: {response.status_code} {response.text}")
+    response = await client.get("/applications")
+    ids = {app["name"]: app["id"] for app in response.json()}
+    for i in range(dataset.apps):
+        for c in range(dataset.capabilities):
+            await client.put(f"/applications/{ids[app_name(i)]}/capabilities",
+                             json={"capability": capability_name(c)})
+
+    lines = []
+    for u in range(dataset.users):
+        for _ in range(consents_per_user):
+            requesting, destination = dataset.pair()
+            lines.append(json.dumps({
+                "user_id": f"bench-user-{u}",
+                "requesting_app_name": requesting,
+                "destination_app_name": destination,
+                "capabilities": dataset.capability_list()
+            }))
+    if lines:
+        response = await client.post("/consent/import", content="\n".join(lines).encode(),
+                                     headers={"Content-Type": "application/x-ndjson"}, timeout=None)
+        if response.status_code != 200:
+            raise RuntimeError(f"Seeding consents failed: {response.status_code} {response.text}")
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, operation: str, seconds: float, status: str, error: bool):
+        self.latencies.setdefault(operation, []).append(seconds)
+        statuses = self.statuses.setdefault(operation, {})
+        statuses[status] = statuses.get(status, 0) + 1
+        if error:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+async def request(client: httpx.AsyncClient, dataset: Dataset, write_ratio: float):
+    """Issue one request of the mix and return (operation, status, is_error)"""
+    user = dataset.user()
+    requesting, destination = dataset.pair()
+    roll = dataset.random.random()
+    if roll >= write_ratio:
+        response = await client.post("/consent/check", json={
+            "user_id": user, "requesting_app_name": requesting,
+            "destination_app_name": destination, "capabilities": dataset.capability_list()
+        })
+        return "check", response.status_code, response.status_code != 200
+    capability = dataset.capability_list(1)[0]
+    if roll < write_ratio / 2:
+        response = await client.post("/consent", json={
+            "user_id": user, "requesting_app_name": requesting,
+            "destination_app_name": destination, "capabilities": [capability]
+        })
+        dataset.granted.append((user, requesting, destination, capability))
+        return "grant", response.status_code, response.status_code != 200
+    if dataset.granted:
+        user, requesting, destination, capability = dataset.granted.popleft()
+    response = await client.request("DELETE", f"/consent/user/{user}/capability", json={
+        "user_id": user, "requesting_app_name": requesting,
+        "destination_app_name": destination, "capability": capability
+    })
+    # 404 only means the consent was not granted
+    return "revoke", response.status_code, response.status_code not in (200, 404)
+
+async def worker(client: httpx.AsyncClient, dataset: Dataset, write_ratio: float,
+                 deadline: float, recorder: Optional[Recorder]):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            operation, status, error = await request(client, dataset, write_ratio)
+        except httpx.HTTPError as e:
+            operation, status, error = "error", type(e).__name__, True
+        if recorder is not None:
+            recorder.record(operation, time.perf_counter() - started, str(status), error)
+
+async def run_phase(client: httpx.AsyncClient, dataset: Dataset, args, seconds: float,
+                    recorder: Optional[Recorder]) -> float:
+    started = time.perf_counter()
+    deadline = started + seconds
+    await asyncio.gather(*(
+        worker(client, dataset, args.write_ratio, deadline, recorder) for _ in range(args.concurrency)
+    ))
+    return time.perf_counter() - started
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    summary = {"requests": len(ordered), "throughput_rps": len(ordered) / elapsed if elapsed else 0.0}
+    if ordered:
+        latency = {"mean": sum(ordered) / len(ordered) * 1000, "max": ordered[-1] * 1000}
+        for pct in PERCENTILES:
+            latency[f"p{pct}"] = percentile(ordered, pct) * 1000
+        summary["latency_ms"] = latency
+    return summary
+
+def report(args, recorder: Recorder, started_at: datetime, elapsed: float, target: str) -> Dict[str, Any]:
+    operations = {}
+    for operation, latencies in sorted(recorder.latencies.items()):
+        operations[operation] = summarize(latencies, elapsed)
+        operations[operation]["errors"] = recorder.errors.get(operation, 0)
+        operations[operation]["statuses"] = recorder.statuses[operation]
+    overall = summarize([s for latencies in recorder.latencies.values() for s in latencies], elapsed)
+    overall["errors"] = sum(recorder.errors.values())
+    return {
+        "started_at": started_at.isoformat() + "Z",
+        "target": target,
+        "elapsed_s": elapsed,
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "write_ratio": args.write_ratio,
+            "users": args.users,
+            "apps": args.apps,
+            "capabilities": args.capabilities,
+            "consents_per_user": args.consents_per_user,
+            "seed": args.seed
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {k: v for k, v in sorted(os.environ.items()) if k.startswith("CONSENT_STORE_")}
+        },
+        "overall": overall,
+        "operations": operations
+    }
+
+async def run(args) -> Dict[str, Any]:
+    if args.url:
+        target = args.url
+        transport = None
+    else:
+        target = "in-process"
+        transport = httpx.ASGITransport(app=load_app(args.data_dir or tempfile.mkdtemp(prefix="consent-bench-")))
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url or "http://consent-store", transport=transport,
+                                 limits=limits, timeout=30) as client:
+        dataset = Dataset(args.users, args.apps, args.capabilities, args.seed)
+        if not args.skip_seed:
+            await seed(client, dataset, args.consents_per_user)
+        if args.warmup > 0:
+            await run_phase(client, dataset, args, args.warmup, None)
+        recorder = Recorder()
+        started_at = datetime.utcnow()
+        elapsed = await run_phase(client, dataset, args, args.duration, recorder)
+    return report(args, recorder, started_at, elapsed, target)
+
+def main():
+    parser = argparse.ArgumentParser(description='Mixed-workload load benchmark for consent-store')
+    parser.add_argument('--url', help='Base URL of a running consent-store (default: run the app in-process)')
+    parser.add_argument('--data-dir', help='Directory for the in-process database files (default: a new temp dir)')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent workers (default: 32)')
+    parser.add_argument('--duration', type=float, default=10, help='Measured seconds (default: 10)')
+    parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds before measuring (default: 2)')
+    parser.add_argument('--write-ratio', type=float, default=0.05,
+                        help='Share of requests that are grants or revokes, split evenly (default: 0.05)')
+    parser.add_argument('--users', type=int, default=10000, help='Distinct user IDs (default: 10000)')
+    parser.add_argument('--apps', type=int, default=10, help='Applications (default: 10)')
+    parser.add_argument('--capabilities', type=int, default=5, help='Capabilities per application (default: 5)')
+    parser.add_argument('--consents-per-user', type=int, default=2,
+                        help='Consent grants seeded per user before the run (default: 2)')
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse data seeded by an earlier run')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--output', help='Write the JSON report to this file as well as stdout')
+    args = parser.parse_args()
+    if args.apps < 2:
+        parser.error('--apps must be at least 2')
+    # The in-process app runs with the data directory as working directory
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    if args.data_dir:
+        args.data_dir = os.path.abspath(args.data_dir)
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Synthetic consent dataset generator and bulk loader for scale testing.
+
+Users are drawn from a Zipf distribution (a few heavy users, a long tail),
+requesting and destination applications from a second, flatter one, and each
+application gets a random number of capabilities. The same seed always yields
+the same dataset.
+
+    # 1M users x 10 grants = ~10M consent rows, loaded through the restore path
+    python benchmarks/generate_dataset.py --db consent_store.db --users 1000000 --grants-per-user 10
+
+    # Write an /admin/export style snapshot instead, for POST /admin/restore
+    python benchmarks/generate_dataset.py --output dataset.ndjson.gz
+
+The restore method replaces everything in the target database.
+"""
+import argparse
+import bisect
+import gzip
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CAPABILITY_WORDS = [
+    "read_profile", "update_profile", "read_email", "send_email", "view_balance", "withdraw",
+    "deposit", "transfer", "view_transactions", "export_transactions", "read_contacts",
+    "write_contacts", "read_calendar", "write_calendar", "read_files", "write_files",
+    "delete_files", "share_files", "read_location", "post_updates", "read_messages",
+    "send_messages", "manage_payments", "view_invoices", "create_invoices", "read_orders",
+    "place_orders", "cancel_orders", "read_health", "write_health"
+]
+
+def zipf_cdf(n: int, s: float) -> List[float]:
+    """Cumulative weights of ranks 1..n under Zipf(s); s=0 is uniform"""
+    return list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+class DatasetGenerator:
+    def __init__(self, seed: int, users: int, apps: int, min_capabilities: int, max_capabilities: int,
+                 grants_per_user: float, user_skew: float, app_skew: float, days: int, end: datetime):
+        self.random = random.Random(seed)
+        self.users = users
+        self.apps = apps
+        self.grants = int(users * grants_per_user)
+        self.days = days
+        self.end = end
+        self.user_cdf = zipf_cdf(users, user_skew)
+        self.app_cdf = zipf_cdf(apps, app_skew)
+        # Application ids are 1..apps; capabilities are fixed up front so every run agrees
+        self.capabilities: Dict[int, List[str]] = {}
+        for app_id in range(1, apps + 1):
+            count = self.random.randint(min_capabilities, max_capabilities)
+            words = self.random.sample(CAPABILITY_WORDS, min(count, len(CAPABILITY_WORDS)))
+            words += [f"capability_{i}" for i in range(count - len(words))]
+            self.capabilities[app_id] = words
+
+    def app_name(self, app_id: int) -> str:
+        return f"app-{app_id:05d}"
+
+    def catalog_records(self) -> Iterator[Dict[str, Any]]:
+        created_at = (self.end - timedelta(days=self.days)).strftime("%Y-%m-%d %H:%M:%S")
+        for app_id in range(1, self.apps + 1):
+            yield {"type": "application", "id": app_id, "name": self.app_name(app_id), "created_at": created_at}
+        for app_id, capabilities in self.capabilities.items():
+            for capability in capabilities:
+                yield {"type": "capability", "application_id": app_id, "capability": capability}
+
+    def _pick(self, cdf: List[float], count: int) -> List[int]:
+        """count 1-based ranks drawn by cumulative weight"""
+        total = cdf[-1]
+        rand = self.random.random
+        return [bisect.bisect(cdf, rand() * total) + 1 for _ in range(count)]
+
+    def consent_batches(self, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """Consent records in batches; duplicates of earlier grants are possible and ignored on load"""
+        span = self.days * 86400
+        remaining = self.grants
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            remaining -= size
+            users = self._pick(self.user_cdf, size)
+            requesting = self._pick(self.app_cdf, size)
+            destination = self._pick(self.app_cdf, size)
+            batch = []
+            for user, requesting_app_id, destination_app_id in zip(users, requesting, destination):
+                if requesting_app_id == destination_app_id:
+                    destination_app_id = destination_app_id % self.apps + 1
+                granted_at = self.end - timedelta(seconds=self.random.randrange(span))
+                batch.append({
+                    "type": "consent",
+                    "user_id": f"user-{user:08d}",
+                    "requesting_app_id": requesting_app_id,
+                    "destination_app_id": destination_app_id,
+                    "capability": self.random.choice(self.capabilities[destination_app_id]),
+                    "granted_at": granted_at.strftime("%Y-%m-%d %H:%M:%S")
+                })
+            yield batch
+
+def open_repository(db_path: str, shards: int):
+    sys.path.insert(0, os.path.join(REPO_ROOT, "consent-store"))
+    from database.sqlite_repository import SQLiteRepository
+    from database.sharded_sqlite_repository import ShardedSQLiteRepository
+    if shards > 1:
+        return ShardedSQLiteRepository(db_path, shards=shards)
+    return SQLiteRepository(db_path)
+
+def load_restore(repository, generator: DatasetGenerator, batch_size: int, progress) -> int:
+    """Replace the database contents through the repository's bulk restore path"""
+    repository.begin_restore()
+    loaded = 0
+    try:
+        repository.restore_records(list(generator.catalog_records()))
+        for batch in generator.consent_batches(batch_size):
+            loaded += repository.restore_records(batch)
+            progress(len(batch), loaded)
+    finally:
+        repository.finish_restore()
+    return loaded
+
+def load_grants(repository, generator: DatasetGenerator, batch_size: int, progress) -> int:
+    """Add the dataset through the regular create/grant repository methods, keeping existing data"""
+    ids = {}
+    for app_id in range(1, generator.apps + 1):
+        name = generator.app_name(app_id)
+        existing = repository.get_application_by_name(name)
+        ids[app_id] = existing['id'] if existing else repository.create_application(name)
+        for capability in generator.capabilities[app_id]:
+            repository.add_capability(ids[app_id], capability)
+
+    loaded = 0
+    for batch in generator.consent_batches(batch_size):
+        loaded += repository.grant_consents_bulk([
+            (r['user_id'], ids[r['requesting_app_id']], ids[r['destination_app_id']], r['capability'])
+            for r in batch
+        ])
+        progress(len(batch), loaded)
+    return loaded
+
+def write_snapshot(path: str, generator: DatasetGenerator, batch_size: int, progress) -> int:
+    """Write the dataset as /admin/export NDJSON, gzip-compressed if path ends in .gz"""
+    opener = gzip.open if path.endswith(".gz") else open
+    written = 0
+    with opener(path, "wt") as f:
+        for record in generator.catalog_records():
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        for batch in generator.consent_batches(batch_size):
+            f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in batch))
+            written += len(batch)
+            progress(len(batch), written)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate and load a synthetic consent dataset')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--users', type=int, default=1000000, help='Distinct users (default: 1000000)')
+    parser.add_argument('--grants-per-user', type=float, default=10,
+                        help='Average consent grants per user; total = users x this (default: 10)')
+    parser.add_argument('--apps', type=int, default=500, help='Applications (default: 500)')
+    parser.add_argument('--min-capabilities', type=int, default=1, help='Fewest capabilities per app (default: 1)')
+    parser.add_argument('--max-capabilities', type=int, default=20, help='Most capabilities per app (default: 20)')
+    parser.add_argument('--user-skew', type=float, default=0.8, help='Zipf exponent for users (default: 0.8)')
+    parser.add_argument('--app-skew', type=float, default=0.6, help='Zipf exponent for applications (default: 0.6)')
+    parser.add_argument('--days', type=int, default=365, help='Spread grant times over this many days (default: 365)')
+    parser.add_argument('--end', default='2025-01-01', help='Latest grant date, YYYY-MM-DD (default: 2025-01-01)')
+    parser.add_argument('--db', default='consent_store.db', help='Database to load (default: consent_store.db)')
+    parser.add_argument('--shards', type=int, default=1, help='Load a sharded store with this many shards (default: 1)')
+    parser.add_argument('--method', choices=['restore', 'grant'], default='restore',
+                        help='restore replaces the database via the bulk restore path; '
+                             'grant appends through grant_consents_bulk (default: restore)')
+    parser.add_argument('--output', help='Write an NDJSON snapshot (.gz for gzip) instead of loading a database')
+    parser.add_argument('--batch-size', type=int, default=50000, help='Records per transaction (default: 50000)')
+    args = parser.parse_args()
+    if args.apps < 2:
+        parser.error('--apps must be at least 2')
+    if not 1 <= args.min_capabilities <= args.max_capabilities:
+        parser.error('need 1 <= --min-capabilities <= --max-capabilities')
+
+    generator = DatasetGenerator(
+        seed=args.seed, users=args.users, apps=args.apps,
+        min_capabilities=args.min_capabilities, max_capabilities=args.max_capabilities,
+        grants_per_user=args.grants_per_user, user_skew=args.user_skew, app_skew=args.app_skew,
+        days=args.days, end=datetime.strptime(args.end, '%Y-%m-%d')
+    )
+
+    started = time.perf_counter()
+    generated = 0
+
+    def progress(batch: int, done: int):
+        nonlocal generated
+        generated += batch
+        elapsed = time.perf_counter() - started
+        print(f"{generated}/{generator.grants} generated, {done} stored, {generated / elapsed:.0f} rows/s",
+              file=sys.stderr)
+
+    if args.output:
+        stored = write_snapshot(args.output, generator, args.batch_size, progress)
+    else:
+        repository = open_repository(args.db, args.shards)
+        try:
+            if args.method == 'restore':
+                stored = load_restore(repository, generator, args.batch_size, progress)
+            else:
+                stored = load_grants(repository, generator, args.batch_size, progress)
+        finally:
+            repository.close()
+
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "seed": args.seed,
+        "users": args.users,
+        "applications": args.apps,
+        "capabilities": sum(len(c) for c in generator.capabilities.values()),
+        "consents_generated": generator.grants,
+        "consents_stored": stored,
+        "target": args.output or args.db,
+        "method": None if args.output else args.method,
+        "elapsed_s": elapsed,
+        "rows_per_s": generator.grants / elapsed if elapsed else 0.0
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
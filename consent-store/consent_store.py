@@ -1,9 +1,30 @@
-from fastapi import FastAPI, Response, Request
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from middleware.cors import CORSMiddleware
+from middleware.coherence import CoherenceMiddleware
 from database.sqlite_repository import SQLiteRepository
+from database.sharded_sqlite_repository import ShardedSQLiteRepository
+from database.memory_repository import InMemoryRepository
 from database.repository import DatabaseRepository
-from routers import applications, consent
+from database.async_repository import AsyncDatabaseRepository, ExecutorAsyncRepository
+from database.cached_repository import CachingRepository, ConsentDecisionCache
+from database.catalog import ApplicationCatalog
+from database.change_feed import ChangeNotifier, NotifyingRepository
+from database.versions import VersionTracker, SharedVersionTracker, VersionedRepository
+from database.coherence import CoherenceMonitor
+from database.jobs import JobManager
+from database.profiling import StatementProfiler
+from database.group_commit import GroupCommitWriter
+from routers import applications, consent, admin
+from routers.pagination import NEXT_CURSOR_HEADER
+from routers.conditional import ETAG_HEADER
+import asyncio
+import logging
+import os
 import sys
+import threading
+import time
+from contextlib import asynccontextmanager
 sys.path.append('/app')  # Add app directory to path
 from config import (
     FRONTEND_EXTERNAL_IP,
@@ -12,62 +33,244 @@ from config import (
     CONSENT_STORE_PORT,
     FRONTEND_EXTERNAL_URL
 )
+import instrumentation
+
+# Database tuning
+DB_POOL_CONNECTIONS = os.getenv("CONSENT_STORE_DB_POOL", "true").lower() == "true"
+DB_CACHE_SIZE_KIB = int(os.getenv("CONSENT_STORE_DB_CACHE_SIZE_KIB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("CONSENT_STORE_DB_MMAP_SIZE", "268435456"))
+DB_SHARDS = int(os.getenv("CONSENT_STORE_SHARDS", "1"))
+# Serve from an in-memory copy of consent_store.db loaded at startup (writes are not persisted)
+DB_MEMORY_REPLICA = os.getenv("CONSENT_STORE_MEMORY_REPLICA", "false").lower() == "true"
+CONSENT_CACHE_SIZE = int(os.getenv("CONSENT_STORE_CACHE_SIZE", "100000"))
+# "executor" runs the blocking repository on a dedicated thread pool; "inline" calls it on the event loop
+# and is only for tests against the in-memory replica
+DB_BACKEND = os.getenv("CONSENT_STORE_DB_BACKEND", "executor").lower()
+DB_THREADS = int(os.getenv("CONSENT_STORE_DB_THREADS", "8"))
+# Change feed waiters re-poll this often to pick up writes made by other processes
+CHANGES_POLL_INTERVAL = float(os.getenv("CONSENT_STORE_CHANGES_POLL_INTERVAL", "1.0"))
+CHANGES_HEARTBEAT_INTERVAL = float(os.getenv("CONSENT_STORE_CHANGES_HEARTBEAT", "15"))
+# Bulk revocations and application cascades delete this many rows per transaction
+DELETE_CHUNK_SIZE = int(os.getenv("CONSENT_STORE_DELETE_CHUNK_SIZE", "5000"))
+DELETE_CHUNK_PAUSE = int(os.getenv("CONSENT_STORE_DELETE_CHUNK_PAUSE_MS", "5")) / 1000
+# Commit concurrent grants and revokes from /consent in shared transactions
+GROUP_COMMIT = os.getenv("CONSENT_STORE_GROUP_COMMIT", "true").lower() == "true"
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("CONSENT_STORE_GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("CONSENT_STORE_GROUP_COMMIT_MAX_BATCH", "500"))
+# Encode listing rows with orjson directly instead of through Pydantic models
+FAST_JSON = os.getenv("CONSENT_STORE_FAST_JSON", "true").lower() == "true"
+# Time every SQLite statement, keep per-shape aggregates and log slow ones with their plan
+SQL_PROFILE = os.getenv("CONSENT_STORE_SQL_PROFILE", "false").lower() == "true"
+SQL_SLOW_MS = float(os.getenv("CONSENT_STORE_SQL_SLOW_MS", "50"))
+# Open the database, load the catalog and read the consent index at startup; /ready reports 503 until done
+WARM_START = os.getenv("CONSENT_STORE_WARM_START", "true").lower() == "true"
+WARM_START_RETRY_SECONDS = 5
+# uvicorn worker processes when run as a script
+WORKERS = int(os.getenv("CONSENT_STORE_WORKERS", "1"))
+# Apply writes committed by other processes to this one's caches before each request (needed with several workers)
+COHERENCE = os.getenv("CONSENT_STORE_COHERENCE", str(WORKERS > 1)).lower() == "true"
+
+logger = logging.getLogger("consent_store")
 
 # Initialize the database repository
 _db_repository: DatabaseRepository = None
+_consent_cache: ConsentDecisionCache = None
+_catalog: ApplicationCatalog = None
+_async_db_repository: AsyncDatabaseRepository = None
+_change_notifier = ChangeNotifier()
+_versions = VersionTracker()
+_job_manager = JobManager()
+_consent_writer: GroupCommitWriter = None
+_sql_profiler = StatementProfiler(slow_ms=SQL_SLOW_MS) if SQL_PROFILE else None
+_coherence_monitor: CoherenceMonitor = None
+_repository_lock = threading.Lock()
+_ready = not WARM_START
 
 def get_db_repository() -> DatabaseRepository:
-    global _db_repository
     if _db_repository is None:
-        _db_repository = SQLiteRepository()
+        # The warm start builds the repository on a worker thread while requests may already arrive
+        with _repository_lock:
+            if _db_repository is None:
+                _create_db_repository()
     return _db_repository
 
+def _create_db_repository():
+    global _db_repository, _consent_cache, _coherence_monitor, _versions
+    if COHERENCE and DB_MEMORY_REPLICA:
+        raise ValueError("CONSENT_STORE_MEMORY_REPLICA keeps writes in one process and cannot be shared by workers")
+    if DB_MEMORY_REPLICA:
+        # Opening the file through SQLiteRepository first brings its schema up to date
+        SQLiteRepository(pooled=False).close()
+        repository = InMemoryRepository.load_from_sqlite()
+    elif DB_SHARDS > 1:
+        repository = ShardedSQLiteRepository(
+            shards=DB_SHARDS,
+            pooled=DB_POOL_CONNECTIONS,
+            cache_size_kib=DB_CACHE_SIZE_KIB,
+            mmap_size=DB_MMAP_SIZE,
+            profiler=_sql_profiler
+        )
+    else:
+        repository = SQLiteRepository(
+            pooled=DB_POOL_CONNECTIONS,
+            cache_size_kib=DB_CACHE_SIZE_KIB,
+            mmap_size=DB_MMAP_SIZE,
+            profiler=_sql_profiler
+        )
+    if CONSENT_CACHE_SIZE > 0:
+        _consent_cache = ConsentDecisionCache(max_size=CONSENT_CACHE_SIZE)
+        repository = CachingRepository(repository, _consent_cache)
+    if COHERENCE:
+        # Every worker derives the same listing versions, and so the same ETags, from the change feed
+        _versions = SharedVersionTracker("consent_store.db")
+    repository = VersionedRepository(repository, _versions)
+    if COHERENCE:
+        # The change feed lives in consent_store.db, also for sharded stores
+        _coherence_monitor = CoherenceMonitor("consent_store.db", _versions, _change_notifier,
+                                              _consent_cache, get_catalog)
+    _db_repository = NotifyingRepository(repository, _change_notifier)
+
+def get_async_db_repository() -> AsyncDatabaseRepository:
+    global _async_db_repository
+    if _async_db_repository is None:
+        repository = get_db_repository()
+        with _repository_lock:
+            if _async_db_repository is None:
+                if DB_BACKEND not in ("executor", "inline"):
+                    raise ValueError(f"Unknown CONSENT_STORE_DB_BACKEND '{DB_BACKEND}'")
+                if DB_BACKEND == "inline" and not DB_MEMORY_REPLICA:
+                    raise ValueError("CONSENT_STORE_DB_BACKEND=inline would block the event loop on SQLite; "
+                                     "it is only for tests against CONSENT_STORE_MEMORY_REPLICA")
+                max_workers = DB_THREADS if DB_BACKEND == "executor" else 0
+                _async_db_repository = ExecutorAsyncRepository(
+                    repository,
+                    max_workers=max_workers,
+                    observe=instrumentation.DB_SECONDS.observe
+                )
+    return _async_db_repository
+
+async def open_repository() -> AsyncDatabaseRepository:
+    """Return the async repository, opening the database on a worker thread if it is not open yet"""
+    if _async_db_repository is None:
+        # Opening creates or migrates the schema, which must not block the event loop
+        await asyncio.to_thread(get_async_db_repository)
+    return _async_db_repository
+
+def get_catalog() -> ApplicationCatalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = ApplicationCatalog(get_db_repository())
+    return _catalog
+
+def get_change_notifier() -> ChangeNotifier:
+    return _change_notifier
+
+def get_versions() -> VersionTracker:
+    # With coherence the tracker reads the database, so it is created with the repository
+    get_db_repository()
+    return _versions
+
+def get_consent_writer() -> GroupCommitWriter:
+    """Return the group commit writer, or None when group commit is disabled"""
+    global _consent_writer
+    if _consent_writer is None and GROUP_COMMIT:
+        _consent_writer = GroupCommitWriter(
+            get_async_db_repository(),
+            window_ms=GROUP_COMMIT_WINDOW_MS,
+            max_batch=GROUP_COMMIT_MAX_BATCH
+        )
+    return _consent_writer
+
+def get_coherence_monitor() -> CoherenceMonitor:
+    """Return the monitor for other processes' writes, or None when coherence is off or the
+    repository is not open yet"""
+    return _coherence_monitor
+
+def get_sql_profiler() -> StatementProfiler:
+    """Return the SQL statement profiler, or None when profiling is disabled"""
+    return _sql_profiler
+
+def get_job_manager() -> JobManager:
+    return _job_manager
+
+def get_consent_cache() -> ConsentDecisionCache:
+    """Return the consent decision cache, or None when caching is disabled"""
+    get_db_repository()
+    return _consent_cache
+
+async def warm_start():
+    """Open the repository, load the application catalog and read the consent index into the page cache.
+
+    Runs in the background so /health answers while it works; a failure is
+    logged and the whole sequence retried.
+    """
+    global _ready
+    while True:
+        try:
+            started = time.perf_counter()
+            db = await open_repository()
+            await db.run(get_catalog().refresh)
+            entries = await db.warm_up()
+        except Exception:
+            logger.exception("Warm start failed, retrying in %s s", WARM_START_RETRY_SECONDS)
+            await asyncio.sleep(WARM_START_RETRY_SECONDS)
+            continue
+        _ready = True
+        logger.info("Warm start read %d consent entries in %.2f s", entries, time.perf_counter() - started)
+        return
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = asyncio.create_task(warm_start()) if WARM_START else None
+    if task is None:
+        # Without the warm start, open the database before taking requests rather than on the first one
+        await open_repository()
+    try:
+        yield
+    finally:
+        if task is not None:
+            task.cancel()
+
 # Create FastAPI app
 app = FastAPI(
     title="Consent Store API",
     description="Service for managing application capabilities and user consent",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# FORCE CORS headers on ALL responses using custom middleware
-@app.middleware("http") 
-async def force_cors_headers(request, call_next):
-    response = await call_next(request)
-    
-    # Add CORS headers to every response
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "*"
-    response.headers["Access-Control-Max-Age"] = "3600"
-    
-    return response
-
-# Also handle OPTIONS requests at the app level
-@app.options("/{path:path}")
-async def global_options_handler():
-    """Handle all OPTIONS requests globally"""
-    return Response(
-        status_code=200,
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-            "Access-Control-Max-Age": "3600",
-        }
-    )
+# Other workers' writes are applied before routing, so caches never serve them stale
+if COHERENCE:
+    app.add_middleware(CoherenceMiddleware, monitor=get_coherence_monitor, repository=get_async_db_repository)
+# CORS for every response, with preflights answered before routing
+app.add_middleware(CORSMiddleware, expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER])
+# Request and database metrics at /metrics
+instrumentation.instrument(app)
 
 # Include routers
 app.include_router(applications.router)
 app.include_router(consent.router)
+app.include_router(admin.router)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Consent Store API", "version": "1.0.0"}
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Whether startup warm-up has finished and the instance should take traffic"""
+    if not _ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=CONSENT_STORE_PORT)
\ No newline at end of file
+    if WORKERS > 1:
+        # Each worker process imports the app itself
+        uvicorn.run("consent_store:app", host="0.0.0.0", port=CONSENT_STORE_PORT, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=CONSENT_STORE_PORT)
\ No newline at end of file
@@ -0,0 +1,342 @@
+import asyncio
+import functools
+import itertools
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Set, Tuple, Iterable, AsyncIterator, Callable
+from database.repository import DatabaseRepository
+
+class AsyncDatabaseRepository(ABC):
+    """Async counterpart of DatabaseRepository used by the FastAPI routers"""
+
+    @abstractmethod
+    async def create_application(self, name: str) -> int:
+        """Create a new application and return its ID"""
+        pass
+
+    @abstractmethod
+    async def get_application(self, app_id: int) -> Optional[Dict[str, Any]]:
+        """Get application by ID"""
+        pass
+
+    @abstractmethod
+    async def get_application_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get application by name"""
+        pass
+
+    @abstractmethod
+    async def list_applications(self, limit: Optional[int] = None,
+                                after: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List applications ordered by name; with limit/after, return the keyset page after that name"""
+        pass
+
+    @abstractmethod
+    async def list_applications_with_capabilities(self, limit: Optional[int] = None,
+                                                  after: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Like list_applications, with each application's capabilities, read in one query"""
+        pass
+
+    async def iter_applications(self, page_size: int = 500, after: Optional[str] = None,
+                                with_capabilities: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every application page by page, so memory use stays flat"""
+        list_page = self.list_applications_with_capabilities if with_capabilities else self.list_applications
+        while True:
+            page = await list_page(limit=page_size, after=after)
+            if page:
+                after = page[-1]['name']
+            for app in page:
+                yield app
+            if len(page) < page_size:
+                return
+
+    @abstractmethod
+    async def delete_application(self, app_id: int) -> bool:
+        """Delete an application and all its related data"""
+        pass
+
+    @abstractmethod
+    async def add_capability(self, app_id: int, capability: str) -> bool:
+        """Add a capability to an application"""
+        pass
+
+    @abstractmethod
+    async def remove_capability(self, app_id: int, capability: str) -> bool:
+        """Remove a capability from an application"""
+        pass
+
+    @abstractmethod
+    async def list_capabilities(self, app_id: int) -> List[str]:
+        """List all capabilities for an application"""
+        pass
+
+    @abstractmethod
+    async def grant_consent(self, user_id: str, requesting_app_id: int,
+                           destination_app_id: int, capability: str) -> bool:
+        """Grant user consent for an app to use another app's capability"""
+        pass
+
+    @abstractmethod
+    async def grant_consents_bulk(self, grants: Iterable[Tuple[str, int, int, str]]) -> int:
+        """Grant many consents in one transaction; return the number newly granted"""
+        pass
+
+    @abstractmethod
+    async def grant_consent_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                                    capabilities: List[str]) -> Dict[str, Any]:
+        """Resolve applications by name, validate capabilities and grant them in one transaction"""
+        pass
+
+    @abstractmethod
+    async def grant_consents_by_name(self, grants: List[Tuple[str, str, str, List[str]]]) -> List[Dict[str, Any]]:
+        """grant_consent_by_name for several requests in one transaction"""
+        pass
+
+    @abstractmethod
+    async def apply_consent_writes(self, writes: List[Tuple[str, str, int, int, str]]) -> List[bool]:
+        """Apply grant and revoke writes in order in one transaction"""
+        pass
+
+    @abstractmethod
+    async def check_consent(self, user_id: str, requesting_app_id: int,
+                           destination_app_id: int, capabilities: List[str]) -> Dict[str, bool]:
+        """Check if user has granted consent for specific capabilities"""
+        pass
+
+    @abstractmethod
+    async def check_consent_batch(self, checks: List[Tuple[str, int, int, List[str]]]) -> List[Dict[str, bool]]:
+        """Check many consent tuples at once, returning results in input order"""
+        pass
+
+    @abstractmethod
+    async def list_granted_capabilities(self, user_id: str, requesting_app_id: int,
+                                        destination_app_id: int) -> Set[str]:
+        """List every capability the user has granted for an app pair"""
+        pass
+
+    @abstractmethod
+    async def revoke_consent(self, user_id: str, requesting_app_id: int,
+                            destination_app_id: int, capability: str) -> bool:
+        """Revoke specific consent"""
+        pass
+
+    @abstractmethod
+    async def revoke_all_user_consent(self, user_id: str) -> int:
+        """Revoke all consent for a specific user, return count of revoked consents"""
+        pass
+
+    @abstractmethod
+    async def revoke_all_consent(self) -> int:
+        """Revoke all consent in the system, return count of revoked consents"""
+        pass
+
+    @abstractmethod
+    async def list_user_consents(self, user_id: str, limit: Optional[int] = None,
+                                 after: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        """List consents for a specific user, newest first; with limit/after, return the
+        keyset page following the (granted_at, id) cursor"""
+        pass
+
+    async def iter_user_consents(self, user_id: str, page_size: int = 500,
+                                 after: Optional[Tuple[str, int]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every consent of a user page by page, so memory use stays flat"""
+        while True:
+            page = await self.list_user_consents(user_id, limit=page_size, after=after)
+            # Take the cursor before handing the rows out, in case a consumer changes them
+            if page:
+                after = (page[-1]['granted_at'], page[-1]['id'])
+            for consent in page:
+                yield consent
+            if len(page) < page_size:
+                return
+
+    @abstractmethod
+    async def delete_consents_chunk(self, user_id: Optional[str] = None, app_id: Optional[int] = None,
+                                    limit: int = 1000) -> int:
+        """Delete up to limit consents of a user, of an application or of everyone"""
+        pass
+
+    @abstractmethod
+    async def list_changes(self, since: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        """List recorded consent changes with a sequence number above since, oldest first"""
+        pass
+
+    @abstractmethod
+    async def last_change_seq(self) -> int:
+        """Return the sequence number of the latest recorded change, 0 if there is none"""
+        pass
+
+    @abstractmethod
+    def export_batches(self, batch_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield the snapshot records of export_records in lists of up to batch_size"""
+        pass
+
+    @abstractmethod
+    async def begin_restore(self):
+        """Remove all data and defer index maintenance ahead of restore_records"""
+        pass
+
+    @abstractmethod
+    async def restore_records(self, records: List[Dict[str, Any]]) -> int:
+        """Load a chunk of snapshot records in one transaction, return the number loaded"""
+        pass
+
+    @abstractmethod
+    async def finish_restore(self):
+        """Rebuild whatever begin_restore deferred"""
+        pass
+
+    @abstractmethod
+    async def warm_up(self) -> int:
+        """Read the indexes consent checks use into the page cache, return the number of consent entries read"""
+        pass
+
+class ExecutorAsyncRepository(AsyncDatabaseRepository):
+    """Runs a blocking DatabaseRepository on a dedicated thread pool.
+
+    Database work never competes with Starlette's shared threadpool, and with
+    pooled SQLite connections each executor thread keeps its own connection.
+    With max_workers=0 calls run inline on the event loop; that is only meant
+    for tests against repositories that never block. If observe is given it is called
+    with the run time in seconds and the callable's name, on the thread that ran it.
+    """
+
+    def __init__(self, repository: DatabaseRepository, max_workers: int = 8,
+                 observe: Optional[Callable[[float, str], None]] = None):
+        self.repository = repository
+        self._observe = observe
+        self._executor = None
+        if max_workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="consent-db")
+
+    def _timed(self, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._observe(time.perf_counter() - started, getattr(func, "__name__", "call"))
+
+    async def run(self, func, *args):
+        """Run a blocking callable on the database executor"""
+        if self._observe is not None:
+            func, args = self._timed, (func,) + args
+        if self._executor is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def create_application(self, name: str) -> int:
+        return await self.run(self.repository.create_application, name)
+
+    async def get_application(self, app_id: int) -> Optional[Dict[str, Any]]:
+        return await self.run(self.repository.get_application, app_id)
+
+    async def get_application_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        return await self.run(self.repository.get_application_by_name, name)
+
+    async def list_applications(self, limit: Optional[int] = None,
+                                after: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self.run(self.repository.list_applications, limit, after)
+
+    async def list_applications_with_capabilities(self, limit: Optional[int] = None,
+                                                  after: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self.run(self.repository.list_applications_with_capabilities, limit, after)
+
+    async def delete_application(self, app_id: int) -> bool:
+        return await self.run(self.repository.delete_application, app_id)
+
+    async def add_capability(self, app_id: int, capability: str) -> bool:
+        return await self.run(self.repository.add_capability, app_id, capability)
+
+    async def remove_capability(self, app_id: int, capability: str) -> bool:
+        return await self.run(self.repository.remove_capability, app_id, capability)
+
+    async def list_capabilities(self, app_id: int) -> List[str]:
+        return await self.run(self.repository.list_capabilities, app_id)
+
+    async def grant_consent(self, user_id: str, requesting_app_id: int,
+                           destination_app_id: int, capability: str) -> bool:
+        return await self.run(self.repository.grant_consent, user_id, requesting_app_id,
+                              destination_app_id, capability)
+
+    async def grant_consents_bulk(self, grants: Iterable[Tuple[str, int, int, str]]) -> int:
+        return await self.run(self.repository.grant_consents_bulk, grants)
+
+    async def grant_consent_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                                    capabilities: List[str]) -> Dict[str, Any]:
+        return await self.run(self.repository.grant_consent_by_name, user_id, requesting_app_name,
+                              destination_app_name, capabilities)
+
+    async def grant_consents_by_name(self, grants: List[Tuple[str, str, str, List[str]]]) -> List[Dict[str, Any]]:
+        return await self.run(self.repository.grant_consents_by_name, grants)
+
+    async def apply_consent_writes(self, writes: List[Tuple[str, str, int, int, str]]) -> List[bool]:
+        return await self.run(self.repository.apply_consent_writes, writes)
+
+    async def check_consent(self, user_id: str, requesting_app_id: int,
+                           destination_app_id: int, capabilities: List[str]) -> Dict[str, bool]:
+        return await self.run(self.repository.check_consent, user_id, requesting_app_id,
+                              destination_app_id, capabilities)
+
+    async def check_consent_batch(self, checks: List[Tuple[str, int, int, List[str]]]) -> List[Dict[str, bool]]:
+        return await self.run(self.repository.check_consent_batch, checks)
+
+    async def list_granted_capabilities(self, user_id: str, requesting_app_id: int,
+                                        destination_app_id: int) -> Set[str]:
+        return await self.run(self.repository.list_granted_capabilities, user_id,
+                              requesting_app_id, destination_app_id)
+
+    async def revoke_consent(self, user_id: str, requesting_app_id: int,
+                            destination_app_id: int, capability: str) -> bool:
+        return await self.run(self.repository.revoke_consent, user_id, requesting_app_id,
+                              destination_app_id, capability)
+
+    async def revoke_all_user_consent(self, user_id: str) -> int:
+        return await self.run(self.repository.revoke_all_user_consent, user_id)
+
+    async def revoke_all_consent(self) -> int:
+        return await self.run(self.repository.revoke_all_consent)
+
+    async def list_user_consents(self, user_id: str, limit: Optional[int] = None,
+                                 after: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        return await self.run(self.repository.list_user_consents, user_id, limit, after)
+
+    async def delete_consents_chunk(self, user_id: Optional[str] = None, app_id: Optional[int] = None,
+                                    limit: int = 1000) -> int:
+        return await self.run(self.repository.delete_consents_chunk, user_id, app_id, limit)
+
+    async def list_changes(self, since: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        return await self.run(self.repository.list_changes, since, limit)
+
+    async def last_change_seq(self) -> int:
+        return await self.run(self.repository.last_change_seq)
+
+    async def export_batches(self, batch_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        records = self.repository.export_records()
+        try:
+            while True:
+                batch = await self.run(list, itertools.islice(records, batch_size))
+                if not batch:
+                    return
+                yield batch
+        finally:
+            # Ends the export's read transaction even if the client went away mid-stream
+            await self.run(records.close)
+
+    async def begin_restore(self):
+        return await self.run(self.repository.begin_restore)
+
+    async def restore_records(self, records: List[Dict[str, Any]]) -> int:
+        return await self.run(self.repository.restore_records, records)
+
+    async def finish_restore(self):
+        return await self.run(self.repository.finish_restore)
+
+    async def warm_up(self) -> int:
+        return await self.run(self.repository.warm_up)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if hasattr(self.repository, 'close'):
+            self.repository.close()
@@ -0,0 +1,236 @@
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, FrozenSet, Tuple, Set, Iterable
+from database.repository import DatabaseRepository
+from database.forwarding_repository import ForwardingRepository
+
+ConsentKey = Tuple[str, int, int]
+
+class ConsentDecisionCache:
+    """Bounded LRU of granted-capability sets keyed by (user_id, requesting_app_id, destination_app_id)"""
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[ConsentKey, FrozenSet[str]]" = OrderedDict()
+        self._keys_by_user: Dict[str, Set[ConsentKey]] = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with a write is not cached
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: ConsentKey) -> Optional[FrozenSet[str]]:
+        with self._lock:
+            granted = self._entries.get(key)
+            if granted is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return granted
+
+    def put(self, key: ConsentKey, granted: FrozenSet[str], generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            if key not in self._entries:
+                self._keys_by_user.setdefault(key[0], set()).add(key)
+            self._entries[key] = granted
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self._forget_user_key(evicted)
+                self.evictions += 1
+
+    def _forget_user_key(self, key: ConsentKey):
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+    def invalidate(self, key: ConsentKey):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(key, None) is not None:
+                self._forget_user_key(key)
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            self._generation += 1
+            for key in self._keys_by_user.pop(user_id, ()):
+                self._entries.pop(key, None)
+
+    def invalidate_application(self, app_id: int):
+        with self._lock:
+            self._generation += 1
+            stale = [key for key in self._entries if key[1] == app_id or key[2] == app_id]
+            for key in stale:
+                del self._entries[key]
+                self._forget_user_key(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+class CachingRepository(ForwardingRepository):
+    """Answers consent checks from a ConsentDecisionCache and invalidates it on every consent write"""
+
+    def __init__(self, inner: DatabaseRepository, cache: ConsentDecisionCache):
+        super().__init__(inner)
+        self.cache = cache
+
+    def _granted(self, user_id: str, requesting_app_id: int, destination_app_id: int) -> FrozenSet[str]:
+        key = (user_id, requesting_app_id, destination_app_id)
+        granted = self.cache.get(key)
+        if granted is None:
+            generation = self.cache.generation()
+            granted = frozenset(self.inner.list_granted_capabilities(*key))
+            self.cache.put(key, granted, generation)
+        return granted
+
+    def check_consent(self, user_id: str, requesting_app_id: int,
+                     destination_app_id: int, capabilities: List[str]) -> Dict[str, bool]:
+        granted = self._granted(user_id, requesting_app_id, destination_app_id)
+        return {cap: cap in granted for cap in capabilities}
+
+    def check_consent_batch(self, checks: List[Tuple[str, int, int, List[str]]]) -> List[Dict[str, bool]]:
+        results: List[Optional[Dict[str, bool]]] = [None] * len(checks)
+        misses = []
+        for item, (user_id, requesting_app_id, destination_app_id, capabilities) in enumerate(checks):
+            granted = self.cache.get((user_id, requesting_app_id, destination_app_id))
+            if granted is None:
+                misses.append(item)
+            else:
+                results[item] = {cap: cap in granted for cap in capabilities}
+        if misses:
+            answers = self.inner.check_consent_batch([checks[item] for item in misses])
+            for item, answer in zip(misses, answers):
+                results[item] = answer
+        return results
+
+    def list_granted_capabilities(self, user_id: str, requesting_app_id: int,
+                                  destination_app_id: int) -> Set[str]:
+        return set(self._granted(user_id, requesting_app_id, destination_app_id))
+
+    def grant_consent(self, user_id: str, requesting_app_id: int,
+                     destination_app_id: int, capability: str) -> bool:
+        try:
+            return self.inner.grant_consent(user_id, requesting_app_id, destination_app_id, capability)
+        finally:
+            self.cache.invalidate((user_id, requesting_app_id, destination_app_id))
+
+    def grant_consents_bulk(self, grants: Iterable[Tuple[str, int, int, str]]) -> int:
+        grants = list(grants)
+        try:
+            return self.inner.grant_consents_bulk(grants)
+        finally:
+            for key in {grant[:3] for grant in grants}:
+                self.cache.invalidate(key)
+
+    def grant_consent_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                              capabilities: List[str]) -> Dict[str, Any]:
+        try:
+            result = self.inner.grant_consent_by_name(user_id, requesting_app_name, destination_app_name,
+                                                      capabilities)
+        except Exception:
+            # The application IDs are unknown here, so drop everything cached for the user
+            self.cache.invalidate_user(user_id)
+            raise
+        if result['newly_granted']:
+            self.cache.invalidate((user_id, result['requesting_app_id'], result['destination_app_id']))
+        return result
+
+    def grant_consents_by_name(self, grants: List[Tuple[str, str, str, List[str]]]) -> List[Dict[str, Any]]:
+        grants = list(grants)
+        try:
+            results = self.inner.grant_consents_by_name(grants)
+        except Exception:
+            for user_id in {grant[0] for grant in grants}:
+                self.cache.invalidate_user(user_id)
+            raise
+        for grant, result in zip(grants, results):
+            if result['newly_granted']:
+                self.cache.invalidate((grant[0], result['requesting_app_id'], result['destination_app_id']))
+        return results
+
+    def apply_consent_writes(self, writes: List[Tuple[str, str, int, int, str]]) -> List[bool]:
+        writes = list(writes)
+        try:
+            return self.inner.apply_consent_writes(writes)
+        finally:
+            for key in {write[1:4] for write in writes}:
+                self.cache.invalidate(key)
+
+    def revoke_consent(self, user_id: str, requesting_app_id: int,
+                      destination_app_id: int, capability: str) -> bool:
+        try:
+            return self.inner.revoke_consent(user_id, requesting_app_id, destination_app_id, capability)
+        finally:
+            self.cache.invalidate((user_id, requesting_app_id, destination_app_id))
+
+    def revoke_all_user_consent(self, user_id: str) -> int:
+        try:
+            return self.inner.revoke_all_user_consent(user_id)
+        finally:
+            self.cache.invalidate_user(user_id)
+
+    def revoke_all_consent(self) -> int:
+        try:
+            return self.inner.revoke_all_consent()
+        finally:
+            self.cache.clear()
+
+    def delete_consents_chunk(self, user_id: Optional[str] = None, app_id: Optional[int] = None,
+                              limit: int = 1000) -> int:
+        try:
+            return self.inner.delete_consents_chunk(user_id, app_id, limit)
+        finally:
+            if user_id is not None:
+                self.cache.invalidate_user(user_id)
+            elif app_id is not None:
+                self.cache.invalidate_application(app_id)
+            else:
+                self.cache.clear()
+
+    def delete_application(self, app_id: int) -> bool:
+        try:
+            return self.inner.delete_application(app_id)
+        finally:
+            self.cache.invalidate_application(app_id)
+
+    def remove_capability(self, app_id: int, capability: str) -> bool:
+        # Grants reference the capability row, so removing it revokes them
+        try:
+            return self.inner.remove_capability(app_id, capability)
+        finally:
+            self.cache.invalidate_application(app_id)
+
+    def begin_restore(self):
+        try:
+            return self.inner.begin_restore()
+        finally:
+            self.cache.clear()
+
+    def finish_restore(self):
+        # Decisions cached while the restore was running saw a partly loaded store
+        try:
+            return self.inner.finish_restore()
+        finally:
+            self.cache.clear()
@@ -0,0 +1,109 @@
+import threading
+from typing import Dict, Any, Optional, FrozenSet
+from database.repository import DatabaseRepository
+
+class ApplicationCatalog:
+    """In-memory copy of the applications and capabilities tables.
+
+    Lookups never touch the database. The maps are replaced wholesale on
+    every change (copy-on-write), so readers need no lock.
+    """
+
+    def __init__(self, repository: DatabaseRepository):
+        self.repository = repository
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._by_id: Dict[int, Dict[str, Any]] = {}
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._capabilities: Dict[int, FrozenSet[str]] = {}
+
+    def refresh(self):
+        """Reload the whole catalog from the repository"""
+        with self._lock:
+            by_id = {}
+            capabilities = {}
+            for app in self.repository.list_applications_with_capabilities():
+                capabilities[app['id']] = frozenset(app.pop('capabilities'))
+                by_id[app['id']] = app
+            self._publish(by_id, capabilities)
+            self._loaded = True
+
+    def _publish(self, by_id: Dict[int, Dict[str, Any]], capabilities: Dict[int, FrozenSet[str]]):
+        self._by_id = by_id
+        self._by_name = {app['name']: app for app in by_id.values()}
+        self._capabilities = capabilities
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def invalidate(self):
+        """Forget the catalog so the next lookup reloads it from the repository"""
+        with self._lock:
+            self._loaded = False
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.refresh()
+
+    def get_application(self, app_id: int) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        return self._by_id.get(app_id)
+
+    def get_application_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        return self._by_name.get(name)
+
+    def get_capabilities(self, app_id: int) -> FrozenSet[str]:
+        self._ensure_loaded()
+        return self._capabilities.get(app_id, frozenset())
+
+    def application_added(self, app: Dict[str, Any]):
+        with self._lock:
+            if not self._loaded:
+                return
+            by_id = dict(self._by_id)
+            by_id[app['id']] = app
+            capabilities = dict(self._capabilities)
+            capabilities.setdefault(app['id'], frozenset())
+            self._publish(by_id, capabilities)
+
+    def application_deleted(self, app_id: int):
+        with self._lock:
+            if not self._loaded:
+                return
+            by_id = dict(self._by_id)
+            by_id.pop(app_id, None)
+            capabilities = dict(self._capabilities)
+            capabilities.pop(app_id, None)
+            self._publish(by_id, capabilities)
+
+    def reload_application(self, app_id: int):
+        """Re-read one application and its capabilities from the repository"""
+        app = self.repository.get_application(app_id)
+        if app is None:
+            self.application_deleted(app_id)
+            return
+        capabilities = frozenset(self.repository.list_capabilities(app_id))
+        with self._lock:
+            if not self._loaded:
+                return
+            by_id = dict(self._by_id)
+            by_id[app_id] = app
+            self._publish(by_id, {**self._capabilities, app_id: capabilities})
+
+    def capability_added(self, app_id: int, capability: str):
+        with self._lock:
+            if not self._loaded:
+                return
+            capabilities = dict(self._capabilities)
+            capabilities[app_id] = capabilities.get(app_id, frozenset()) | {capability}
+            self._publish(self._by_id, capabilities)
+
+    def capability_removed(self, app_id: int, capability: str):
+        with self._lock:
+            if not self._loaded:
+                return
+            capabilities = dict(self._capabilities)
+            capabilities[app_id] = capabilities.get(app_id, frozenset()) - {capability}
+            self._publish(self._by_id, capabilities)
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Set, Tuple, Iterable
+from database.repository import DatabaseRepository
+from database.forwarding_repository import ForwardingRepository
+
+class ChangeNotifier:
+    """Wakes change feed waiters when this process records a change.
+
+    notify() may be called from any thread (repository calls run on the
+    database executor). Writes made by other processes are not seen here, so
+    waiters should also re-poll on a short interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+
+    def notify(self):
+        with self._lock:
+            waiters = list(self._waiters)
+            self._waiters.clear()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for a change, return whether one was signalled"""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+class NotifyingRepository(ForwardingRepository):
+    """Signals a ChangeNotifier after every operation that can append to the change feed"""
+
+    def __init__(self, inner: DatabaseRepository, notifier: ChangeNotifier):
+        super().__init__(inner)
+        self.notifier = notifier
+
+    def create_application(self, name: str) -> int:
+        try:
+            return self.inner.create_application(name)
+        finally:
+            self.notifier.notify()
+
+    def add_capability(self, app_id: int, capability: str) -> bool:
+        try:
+            return self.inner.add_capability(app_id, capability)
+        finally:
+            self.notifier.notify()
+
+    def grant_consent(self, user_id: str, requesting_app_id: int,
+                     destination_app_id: int, capability: str) -> bool:
+        try:
+            return self.inner.grant_consent(user_id, requesting_app_id, destination_app_id, capability)
+        finally:
+            self.notifier.notify()
+
+    def grant_consents_bulk(self, grants: Iterable[Tuple[str, int, int, str]]) -> int:
+        try:
+            return self.inner.grant_consents_bulk(grants)
+        finally:
+            self.notifier.notify()
+
+    def grant_consent_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                              capabilities: List[str]) -> Dict[str, Any]:
+        try:
+            return self.inner.grant_consent_by_name(user_id, requesting_app_name, destination_app_name,
+                                                    capabilities)
+        finally:
+            self.notifier.notify()
+
+    def grant_consents_by_name(self, grants: List[Tuple[str, str, str, List[str]]]) -> List[Dict[str, Any]]:
+        try:
+            return self.inner.grant_consents_by_name(grants)
+        finally:
+            self.notifier.notify()
+
+    def apply_consent_writes(self, writes: List[Tuple[str, str, int, int, str]]) -> List[bool]:
+        try:
+            return self.inner.apply_consent_writes(writes)
+        finally:
+            self.notifier.notify()
+
+    def revoke_consent(self, user_id: str, requesting_app_id: int,
+                      destination_app_id: int, capability: str) -> bool:
+        try:
+            return self.inner.revoke_consent(user_id, requesting_app_id, destination_app_id, capability)
+        finally:
+            self.notifier.notify()
+
+    def revoke_all_user_consent(self, user_id: str) -> int:
+        try:
+            return self.inner.revoke_all_user_consent(user_id)
+        finally:
+            self.notifier.notify()
+
+    def revoke_all_consent(self) -> int:
+        try:
+            return self.inner.revoke_all_consent()
+        finally:
+            self.notifier.notify()
+
+    def delete_application(self, app_id: int) -> bool:
+        try:
+            return self.inner.delete_application(app_id)
+        finally:
+            self.notifier.notify()
+
+    def remove_capability(self, app_id: int, capability: str) -> bool:
+        try:
+            return self.inner.remove_capability(app_id, capability)
+        finally:
+            self.notifier.notify()
+
+    def finish_restore(self):
+        try:
+            return self.inner.finish_restore()
+        finally:
+            self.notifier.notify()
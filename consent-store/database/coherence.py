@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from database.cached_repository import ConsentDecisionCache
+from database.catalog import ApplicationCatalog
+from database.change_feed import ChangeNotifier
+from database.versions import VersionTracker
+
+class CoherenceMonitor:
+    """Applies writes committed by other processes to this process's caches.
+
+    PRAGMA data_version on a dedicated connection changes whenever any other
+    connection commits to the file, so checking for news costs one cheap
+    statement. When it has moved, the consent_changes rows past the last seen
+    seq are read, page by page, and each one invalidates only what it touched: cached
+    decisions for one user and app pair, one user, or one application, and
+    the catalog entries; the listing versions are updated from the same rows. This process's own writes come
+    back the same way and are applied again, which is harmless.
+    """
+
+    def __init__(self, db_path: str, versions: VersionTracker, notifier: ChangeNotifier,
+                 cache: Optional[ConsentDecisionCache] = None,
+                 catalog: Optional[Callable[[], ApplicationCatalog]] = None, page_size: int = 1000):
+        self.page_size = page_size
+        self.versions = versions
+        self.notifier = notifier
+        self.cache = cache
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        # Autocommit, so no read transaction stays open between polls
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._data_version = self._read_data_version()
+        self._last_seq = self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM consent_changes').fetchone()[0]
+        self.applied = 0
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def poll(self) -> int:
+        """Apply any changes committed since the last poll and return how many there were"""
+        with self._lock:
+            data_version = self._read_data_version()
+            if data_version == self._data_version:
+                return 0
+            self._data_version = data_version
+            count = 0
+            while True:
+                changes = [dict(row) for row in self._conn.execute(
+                    'SELECT * FROM consent_changes WHERE seq > ? ORDER BY seq LIMIT ?',
+                    (self._last_seq, self.page_size)
+                )]
+                if changes:
+                    self._last_seq = changes[-1]['seq']
+                    self._apply(changes)
+                    count += len(changes)
+                if len(changes) < self.page_size:
+                    break
+            self.applied += count
+        if count:
+            self.notifier.notify()
+        return count
+
+    def _apply(self, changes: List[Dict[str, Any]]):
+        catalog = self.catalog() if self.catalog is not None else None
+        for change in changes:
+            kind = change['kind']
+            app_id = change['application_id']
+            if kind in ('grant', 'revoke'):
+                if self.cache is not None:
+                    self.cache.invalidate((change['user_id'], change['requesting_app_id'],
+                                           change['destination_app_id']))
+            elif kind == 'revoke_user':
+                if self.cache is not None:
+                    self.cache.invalidate_user(change['user_id'])
+            elif kind == 'create_application':
+                if catalog is not None:
+                    app = self._conn.execute('SELECT * FROM applications WHERE id = ?', (app_id,)).fetchone()
+                    if app is not None:
+                        catalog.application_added(dict(app))
+            elif kind == 'add_capability':
+                if catalog is not None:
+                    catalog.capability_added(app_id, change['capability'])
+            elif kind in ('delete_application', 'remove_capability'):
+                if self.cache is not None:
+                    self.cache.invalidate_application(app_id)
+                if catalog is not None:
+                    if kind == 'delete_application':
+                        catalog.application_deleted(app_id)
+                    else:
+                        catalog.capability_removed(app_id, change['capability'])
+            elif kind == 'revoke_all':
+                if self.cache is not None:
+                    self.cache.clear()
+            else:
+                # restore, or a kind this version does not know: drop everything
+                if self.cache is not None:
+                    self.cache.clear()
+                if catalog is not None:
+                    catalog.invalidate()
+        self.versions.changes_applied(changes)
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,187 @@
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Optional
+from database.profiling import StatementProfiler
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that can be tracked by the pool (plain connections are not weak-referenceable)"""
+    pass
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's execute and fetch time to its connection's profiler"""
+
+    _stats = None
+    _executed = 0.0
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._executed = time.perf_counter() - started
+            self._stats = self.connection.profiler.record(self.connection, sql, parameters, self._executed)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._stats = None
+            self.connection.profiler.record(self.connection, sql, None, time.perf_counter() - started, many=True)
+
+    def _fetched(self, started: float):
+        if self._stats is not None:
+            fetched = time.perf_counter() - started
+            self.connection.profiler.add_fetch(self._stats, self._executed, fetched)
+            self._executed += fetched
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._fetched(started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._fetched(started)
+
+
+class ProfilingConnection(PooledConnection):
+    """Connection whose statements, including the execute() shortcuts, run on ProfilingCursors"""
+
+    profiler: StatementProfiler = None
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class SQLiteConnectionManager:
+    """Hands out SQLite connections for a single database file.
+
+    In pooled mode every thread keeps one long-lived connection opened in WAL
+    mode, so repeated repository calls reuse the same connection and its
+    prepared statement cache. In unpooled mode a fresh connection is opened
+    and closed for every call. With a profiler every statement is timed.
+    """
+
+    def __init__(self, db_path: str, pooled: bool = True,
+                 cache_size_kib: int = 16384, mmap_size: int = 268435456,
+                 busy_timeout_ms: int = 5000, cached_statements: int = 256,
+                 profiler: Optional[StatementProfiler] = None):
+        self.db_path = db_path
+        self.profiler = profiler
+        self.pooled = pooled
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+        if pooled:
+            self._enable_wal()
+
+    def _enable_wal(self):
+        """Switch the database file to WAL journaling (persistent, so only done once)"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+        finally:
+            conn.close()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+            factory=PooledConnection if self.profiler is None else ProfilingConnection
+        )
+        if self.profiler is not None:
+            conn.profiler = self.profiler
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kib)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.add(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Yield a connection wrapped in a transaction that commits on success"""
+        if not self.pooled:
+            if self.profiler is None:
+                conn = sqlite3.connect(self.db_path)
+            else:
+                conn = sqlite3.connect(self.db_path, factory=ProfilingConnection)
+                conn.profiler = self.profiler
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA foreign_keys=ON')
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            return
+
+        conn = self._thread_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    @contextmanager
+    def snapshot(self):
+        """Yield a dedicated connection holding one read transaction for its whole lifetime.
+
+        Long scans (e.g. exports) see a single consistent state and, in WAL mode,
+        do not block writers. The connection may be used from any thread, one at a time.
+        """
+        conn = self._open()
+        try:
+            conn.execute('BEGIN')
+            # The read snapshot starts with the first read, not with BEGIN
+            conn.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+            yield conn
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def close(self):
+        """Close every pooled connection (e.g. on shutdown)"""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
@@ -0,0 +1,111 @@
+from typing import List, Optional, Dict, Any, Set, Tuple, Iterable, Iterator
+from database.repository import DatabaseRepository
+
+class ForwardingRepository(DatabaseRepository):
+    """Repository that delegates every operation to a wrapped repository.
+
+    Subclasses override only the operations they want to intercept.
+    """
+
+    def __init__(self, inner: DatabaseRepository):
+        self.inner = inner
+
+    def create_application(self, name: str) -> int:
+        return self.inner.create_application(name)
+
+    def get_application(self, app_id: int) -> Optional[Dict[str, Any]]:
+        return self.inner.get_application(app_id)
+
+    def get_application_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.inner.get_application_by_name(name)
+
+    def list_applications(self, limit: Optional[int] = None,
+                          after: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.inner.list_applications(limit, after)
+
+    def list_applications_with_capabilities(self, limit: Optional[int] = None,
+                                            after: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.inner.list_applications_with_capabilities(limit, after)
+
+    def delete_application(self, app_id: int) -> bool:
+        return self.inner.delete_application(app_id)
+
+    def add_capability(self, app_id: int, capability: str) -> bool:
+        return self.inner.add_capability(app_id, capability)
+
+    def remove_capability(self, app_id: int, capability: str) -> bool:
+        return self.inner.remove_capability(app_id, capability)
+
+    def list_capabilities(self, app_id: int) -> List[str]:
+        return self.inner.list_capabilities(app_id)
+
+    def grant_consent(self, user_id: str, requesting_app_id: int,
+                     destination_app_id: int, capability: str) -> bool:
+        return self.inner.grant_consent(user_id, requesting_app_id, destination_app_id, capability)
+
+    def grant_consents_bulk(self, grants: Iterable[Tuple[str, int, int, str]]) -> int:
+        return self.inner.grant_consents_bulk(grants)
+
+    def grant_consent_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                              capabilities: List[str]) -> Dict[str, Any]:
+        return self.inner.grant_consent_by_name(user_id, requesting_app_name, destination_app_name, capabilities)
+
+    def grant_consents_by_name(self, grants: List[Tuple[str, str, str, List[str]]]) -> List[Dict[str, Any]]:
+        return self.inner.grant_consents_by_name(grants)
+
+    def apply_consent_writes(self, writes: List[Tuple[str, str, int, int, str]]) -> List[bool]:
+        return self.inner.apply_consent_writes(writes)
+
+    def check_consent(self, user_id: str, requesting_app_id: int,
+                     destination_app_id: int, capabilities: List[str]) -> Dict[str, bool]:
+        return self.inner.check_consent(user_id, requesting_app_id, destination_app_id, capabilities)
+
+    def check_consent_batch(self, checks: List[Tuple[str, int, int, List[str]]]) -> List[Dict[str, bool]]:
+        return self.inner.check_consent_batch(checks)
+
+    def list_granted_capabilities(self, user_id: str, requesting_app_id: int,
+                                  destination_app_id: int) -> Set[str]:
+        return self.inner.list_granted_capabilities(user_id, requesting_app_id, destination_app_id)
+
+    def revoke_consent(self, user_id: str, requesting_app_id: int,
+                      destination_app_id: int, capability: str) -> bool:
+        return self.inner.revoke_consent(user_id, requesting_app_id, destination_app_id, capability)
+
+    def revoke_all_user_consent(self, user_id: str) -> int:
+        return self.inner.revoke_all_user_consent(user_id)
+
+    def revoke_all_consent(self) -> int:
+        return self.inner.revoke_all_consent()
+
+    def list_user_consents(self, user_id: str, limit: Optional[int] = None,
+                           after: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        return self.inner.list_user_consents(user_id, limit, after)
+
+    def delete_consents_chunk(self, user_id: Optional[str] = None, app_id: Optional[int] = None,
+                              limit: int = 1000) -> int:
+        return self.inner.delete_consents_chunk(user_id, app_id, limit)
+
+    def list_changes(self, since: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        return self.inner.list_changes(since, limit)
+
+    def last_change_seq(self) -> int:
+        return self.inner.last_change_seq()
+
+    def export_records(self) -> Iterator[Dict[str, Any]]:
+        return self.inner.export_records()
+
+    def begin_restore(self):
+        return self.inner.begin_restore()
+
+    def restore_records(self, records: List[Dict[str, Any]]) -> int:
+        return self.inner.restore_records(records)
+
+    def finish_restore(self):
+        return self.inner.finish_restore()
+
+    def warm_up(self) -> int:
+        return self.inner.warm_up()
+
+    def close(self):
+        if hasattr(self.inner, 'close'):
+            self.inner.close()
@@ -0,0 +1,91 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from database.async_repository import AsyncDatabaseRepository
+
+ConsentWrite = Tuple[str, str, int, int, str]
+# (user_id, requesting_app_name, destination_app_name, capabilities)
+NamedGrant = Tuple[str, str, str, List[str]]
+
+class GroupCommitWriter:
+    """Single writer task that commits concurrent consent writes together.
+
+    Callers submit their grant/revoke writes, or grants by application name,
+    and await a future. The writer takes whatever is queued, waits up to
+    window_ms for more (stopping early at max_batch writes), applies the lot
+    with one apply_consent_writes call and one grant_consents_by_name call,
+    each one transaction and one fsync, and hands each caller its own results.
+    Writes arriving while a batch commits form the next batch, so throughput
+    grows with batch size rather than with the fsync rate.
+    """
+
+    def __init__(self, repository: AsyncDatabaseRepository, window_ms: float = 2, max_batch: int = 500):
+        self.repository = repository
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, writes: List[ConsentWrite]) -> List[bool]:
+        """Queue writes for the next group commit and return whether each one changed anything"""
+        if not writes:
+            return []
+        return await self._submit("writes", writes)
+
+    async def submit_grant_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                                   capabilities: List[str]) -> Dict[str, Any]:
+        """Queue a grant_consent_by_name for the next group commit and return its result"""
+        results = await self._submit("by_name", [(user_id, requesting_app_name, destination_app_name,
+                                                  capabilities)])
+        return results[0]
+
+    async def _submit(self, kind: str, items: list) -> list:
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._queue.put_nowait((kind, items, future))
+        return await future
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            size = len(batch[0][1])
+            if self.window > 0 and size < self.max_batch and queue.empty():
+                await asyncio.sleep(self.window)
+            while size < self.max_batch and not queue.empty():
+                item = queue.get_nowait()
+                batch.append(item)
+                size += len(item[1])
+            for kind in ("writes", "by_name"):
+                requests = [item for item in batch if item[0] == kind]
+                if requests:
+                    await self._commit(requests)
+
+    async def _commit(self, batch: List[Tuple[str, list, asyncio.Future]]):
+        items = [item for _, request_items, _ in batch for item in request_items]
+        try:
+            if batch[0][0] == "writes":
+                results = await self.repository.apply_consent_writes(items)
+            else:
+                results = await self.repository.grant_consents_by_name(items)
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][2].done():
+                    batch[0][2].set_exception(e)
+                return
+            # Retry callers one by one so a single bad write only fails its own request
+            for request in batch:
+                await self._commit([request])
+            return
+        offset = 0
+        for _, request_items, future in batch:
+            if not future.done():
+                future.set_result(results[offset:offset + len(request_items)])
+            offset += len(request_items)
@@ -0,0 +1,103 @@
+import asyncio
+import itertools
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from database.async_repository import AsyncDatabaseRepository
+
+class Job:
+    """A background operation and its progress, as reported by /admin/jobs"""
+
+    def __init__(self, job_id: int, kind: str, user_id: Optional[str] = None,
+                 application_id: Optional[int] = None):
+        self.id = job_id
+        self.kind = kind
+        self.user_id = user_id
+        self.application_id = application_id
+        self.status = "pending"
+        self.deleted = 0
+        self.chunks = 0
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    async def wait(self):
+        """Wait for the job without cancelling it if the waiter goes away"""
+        await asyncio.shield(self.task)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "user_id": self.user_id,
+            "application_id": self.application_id,
+            "deleted": self.deleted,
+            "chunks": self.chunks,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class JobManager:
+    """Runs jobs as asyncio tasks and keeps the most recent max_finished of them for status queries"""
+
+    def __init__(self, max_finished: int = 100):
+        self.max_finished = max_finished
+        self._ids = itertools.count(1)
+        self._jobs: "OrderedDict[int, Job]" = OrderedDict()
+
+    def start(self, kind: str, work: Callable[[Job], Awaitable[None]], user_id: Optional[str] = None,
+              application_id: Optional[int] = None) -> Job:
+        """Create a job and run work(job) in the background on the current event loop"""
+        job = Job(next(self._ids), kind, user_id=user_id, application_id=application_id)
+        self._jobs[job.id] = job
+        job.task = asyncio.get_running_loop().create_task(self._run(job, work))
+        self._prune()
+        return job
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[None]]):
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        try:
+            await work(job)
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        return list(self._jobs.values())
+
+async def delete_in_chunks(db: AsyncDatabaseRepository, job: Job, chunk_size: int, pause: float,
+                           user_id: Optional[str] = None, app_id: Optional[int] = None):
+    """Delete matching consents chunk_size rows per transaction, pausing between chunks so
+    checks and other writers get the database in between"""
+    while True:
+        deleted = await db.delete_consents_chunk(user_id, app_id, chunk_size)
+        job.deleted += deleted
+        job.chunks += 1
+        if deleted < chunk_size:
+            return
+        await asyncio.sleep(pause)
@@ -0,0 +1,464 @@
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Set, Tuple, Iterable, Iterator
+from database.repository import DatabaseRepository
+
+ConsentKey = Tuple[str, int, int]
+
+class InMemoryRepository(DatabaseRepository):
+    """Repository that keeps everything in process memory.
+
+    Capability names are interned to small bit positions per destination
+    application. Each (user_id, requesting_app_id, destination_app_id) grant
+    set is stored as one integer bitmask, so check_consent is a dict lookup
+    plus a bitwise AND. Use load_from_sqlite() to build a read-optimized
+    replica of an existing consent_store.db. Writes are not persisted.
+    Each user's grants are also kept in a list sorted by (granted_at, id), so
+    a listing page is a bisect and a slice.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._applications: Dict[int, Dict[str, Any]] = {}
+        self._application_ids: Dict[str, int] = {}
+        self._capabilities: Dict[int, Set[str]] = {}
+        self._capability_bits: Dict[int, Dict[str, int]] = {}
+        self._grants: Dict[ConsentKey, int] = {}
+        self._grant_rows: Dict[Tuple[ConsentKey, int], Tuple[int, str]] = {}
+        self._keys_by_user: Dict[str, Set[ConsentKey]] = {}
+        # (granted_at, consent_id, key, capability) per user, ascending
+        self._rows_by_user: Dict[str, List[Tuple[str, int, ConsentKey, str]]] = {}
+        self._next_app_id = 1
+        self._next_consent_id = 1
+        # The change feed holds sequence numbers _change_base + 1 onwards
+        self._changes: List[Dict[str, Any]] = []
+        self._change_base = 0
+
+    @classmethod
+    def load_from_sqlite(cls, db_path: str = "consent_store.db") -> "InMemoryRepository":
+        """Build a repository from the contents of a SQLite consent store"""
+        repository = cls()
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute('SELECT id, name, created_at FROM applications ORDER BY id'):
+                repository._add_application(dict(row))
+            for row in conn.execute('SELECT application_id, capability FROM capabilities'):
+                repository._capabilities[row['application_id']].add(row['capability'])
+                repository._bit(row['application_id'], row['capability'])
+            for row in conn.execute('''
+                SELECT uc.id, uc.user_id, uc.requesting_app_id, uc.destination_app_id,
+                       c.capability, uc.granted_at
+                FROM user_consents uc
+                JOIN capabilities c ON c.id = uc.capability_id
+                ORDER BY uc.id
+            '''):
+                # Skip rows orphaned by application deletes, as the SQLite join would
+                if row['requesting_app_id'] not in repository._applications:
+                    continue
+                if row['destination_app_id'] not in repository._applications:
+                    continue
+                key = (row['user_id'], row['requesting_app_id'], row['destination_app_id'])
+                repository._grant(key, row['capability'], row['id'], row['granted_at'])
+            # Continue the file's sequence so consumers never see a number twice
+            repository._change_base = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM consent_changes').fetchone()[0]
+        finally:
+            conn.close()
+        return repository
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+    def _add_application(self, app: Dict[str, Any]):
+        self._applications[app['id']] = app
+        self._application_ids[app['name']] = app['id']
+        self._capabilities[app['id']] = set()
+        self._capability_bits[app['id']] = {}
+        self._next_app_id = max(self._next_app_id, app['id'] + 1)
+
+    def _bit(self, destination_app_id: int, capability: str) -> int:
+        """Return the bit position interned for a capability of the destination app"""
+        bits = self._capability_bits.setdefault(destination_app_id, {})
+        bit = bits.get(capability)
+        if bit is None:
+            bit = bits[capability] = len(bits)
+        return bit
+
+    def _grant(self, key: ConsentKey, capability: str, consent_id: int, granted_at: str) -> bool:
+        bit = self._bit(key[2], capability)
+        mask = self._grants.get(key, 0)
+        if mask & (1 << bit):
+            return False
+        self._grants[key] = mask | (1 << bit)
+        self._grant_rows[(key, bit)] = (consent_id, granted_at)
+        self._keys_by_user.setdefault(key[0], set()).add(key)
+        insort(self._rows_by_user.setdefault(key[0], []), (granted_at, consent_id, key, capability))
+        self._next_consent_id = max(self._next_consent_id, consent_id + 1)
+        return True
+
+    def _record_change(self, kind: str, user_id: Optional[str] = None,
+                       requesting_app_id: Optional[int] = None, destination_app_id: Optional[int] = None,
+                       application_id: Optional[int] = None, capability: Optional[str] = None):
+        self._changes.append({
+            "seq": self._change_base + len(self._changes) + 1,
+            "kind": kind,
+            "user_id": user_id,
+            "requesting_app_id": requesting_app_id,
+            "destination_app_id": destination_app_id,
+            "application_id": application_id,
+            "capability": capability,
+            "changed_at": self._now()
+        })
+
+    def _drop_row(self, key: ConsentKey, bit: int):
+        row = self._grant_rows.pop((key, bit), None)
+        if row is None:
+            return
+        consent_id, granted_at = row
+        rows = self._rows_by_user[key[0]]
+        del rows[bisect_left(rows, (granted_at, consent_id))]
+        if not rows:
+            del self._rows_by_user[key[0]]
+
+    def _drop_key(self, key: ConsentKey) -> int:
+        mask = self._grants.pop(key, 0)
+        count = 0
+        bit = 0
+        while mask:
+            if mask & 1:
+                self._drop_row(key, bit)
+                count += 1
+            mask >>= 1
+            bit += 1
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+        return count
+
+    def create_application(self, name: str) -> int:
+        with self._lock:
+            if name in self._application_ids:
+                raise ValueError(f"UNIQUE constraint failed: applications.name ({name})")
+            app_id = self._next_app_id
+            self._add_application({"id": app_id, "name": name, "created_at": self._now()})
+            self._record_change('create_application', application_id=app_id)
+            return app_id
+
+    def get_application(self, app_id: int) -> Optional[Dict[str, Any]]:
+        app = self._applications.get(app_id)
+        return dict(app) if app else None
+
+    def get_application_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        app_id = self._application_ids.get(name)
+        return self.get_application(app_id) if app_id is not None else None
+
+    def list_applications(self, limit: Optional[int] = None,
+                          after: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            apps = sorted(self._applications.values(), key=lambda app: app['name'])
+        if after is not None:
+            apps = [app for app in apps if app['name'] > after]
+        return [dict(app) for app in apps[:limit]]
+
+    def list_applications_with_capabilities(self, limit: Optional[int] = None,
+                                            after: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            apps = self.list_applications(limit, after)
+            for app in apps:
+                app['capabilities'] = sorted(self._capabilities.get(app['id'], ()))
+            return apps
+
+    def delete_application(self, app_id: int) -> bool:
+        with self._lock:
+            app = self._applications.pop(app_id, None)
+            if app is None:
+                return False
+            del self._application_ids[app['name']]
+            self._capabilities.pop(app_id, None)
+            self._capability_bits.pop(app_id, None)
+            for key in [key for key in self._grants if key[1] == app_id or key[2] == app_id]:
+                self._drop_key(key)
+            self._record_change('delete_application', application_id=app_id)
+            return True
+
+    def _add_capability(self, app_id: int, capability: str) -> bool:
+        capabilities = self._capabilities.get(app_id)
+        if capabilities is None or capability in capabilities:
+            return False
+        capabilities.add(capability)
+        self._bit(app_id, capability)
+        return True
+
+    def add_capability(self, app_id: int, capability: str) -> bool:
+        with self._lock:
+            if not self._add_capability(app_id, capability):
+                return False
+            self._record_change('add_capability', application_id=app_id, capability=capability)
+            return True
+
+    def remove_capability(self, app_id: int, capability: str) -> bool:
+        with self._lock:
+            capabilities = self._capabilities.get(app_id)
+            if capabilities is None or capability not in capabilities:
+                return False
+            capabilities.discard(capability)
+            # Removing a capability revokes every grant of it, as in SQLiteRepository
+            bit = self._capability_bits[app_id][capability]
+            for key in [key for key in self._grants if key[2] == app_id]:
+                mask = self._grants[key]
+                if mask & (1 << bit):
+                    self._drop_row(key, bit)
+                    if mask == 1 << bit:
+                        self._drop_key(key)
+                    else:
+                        self._grants[key] = mask & ~(1 << bit)
+            self._record_change('remove_capability', application_id=app_id, capability=capability)
+            return True
+
+    def list_capabilities(self, app_id: int) -> List[str]:
+        with self._lock:
+            return sorted(self._capabilities.get(app_id, ()))
+
+    def grant_consent(self, user_id: str, requesting_app_id: int,
+                     destination_app_id: int, capability: str) -> bool:
+        return self.grant_consents_bulk([(user_id, requesting_app_id, destination_app_id, capability)]) > 0
+
+    def grant_consents_bulk(self, grants: Iterable[Tuple[str, int, int, str]]) -> int:
+        with self._lock:
+            granted_at = self._now()
+            count = 0
+            for user_id, requesting_app_id, destination_app_id, capability in grants:
+                if capability not in self._capabilities.get(destination_app_id, ()):
+                    continue
+                key = (user_id, requesting_app_id, destination_app_id)
+                if self._grant(key, capability, self._next_consent_id, granted_at):
+                    self._record_change('grant', user_id, requesting_app_id, destination_app_id,
+                                        capability=capability)
+                    count += 1
+            return count
+
+    def grant_consent_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                              capabilities: List[str]) -> Dict[str, Any]:
+        capabilities = list(dict.fromkeys(capabilities))
+        with self._lock:
+            result = {
+                "requesting_app_id": self._application_ids.get(requesting_app_name),
+                "destination_app_id": self._application_ids.get(destination_app_name),
+                "newly_granted": [],
+                "already_granted": [],
+                "unknown": []
+            }
+            if result['requesting_app_id'] is None or result['destination_app_id'] is None:
+                return result
+            known = self._capabilities.get(result['destination_app_id'], ())
+            result['unknown'] = [cap for cap in capabilities if cap not in known]
+            if result['unknown']:
+                return result
+
+            key = (user_id, result['requesting_app_id'], result['destination_app_id'])
+            granted_at = self._now()
+            for cap in capabilities:
+                if self._grant(key, cap, self._next_consent_id, granted_at):
+                    self._record_change('grant', *key, capability=cap)
+                    result['newly_granted'].append(cap)
+                else:
+                    result['already_granted'].append(cap)
+            return result
+
+    def grant_consents_by_name(self, grants: List[Tuple[str, str, str, List[str]]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self.grant_consent_by_name(*grant) for grant in grants]
+
+    def apply_consent_writes(self, writes: List[Tuple[str, str, int, int, str]]) -> List[bool]:
+        for write in writes:
+            if write[0] not in ('grant', 'revoke'):
+                raise ValueError(f"Unknown consent write '{write[0]}'")
+        results = []
+        with self._lock:
+            for kind, user_id, requesting_app_id, destination_app_id, capability in writes:
+                if kind == 'grant':
+                    results.append(self.grant_consent(user_id, requesting_app_id, destination_app_id, capability))
+                else:
+                    results.append(self.revoke_consent(user_id, requesting_app_id, destination_app_id, capability))
+        return results
+
+    def check_consent(self, user_id: str, requesting_app_id: int,
+                     destination_app_id: int, capabilities: List[str]) -> Dict[str, bool]:
+        mask = self._grants.get((user_id, requesting_app_id, destination_app_id), 0)
+        bits = self._capability_bits.get(destination_app_id, {})
+        return {cap: cap in bits and bool(mask & (1 << bits[cap])) for cap in capabilities}
+
+    def check_consent_batch(self, checks: List[Tuple[str, int, int, List[str]]]) -> List[Dict[str, bool]]:
+        return [self.check_consent(*check) for check in checks]
+
+    def list_granted_capabilities(self, user_id: str, requesting_app_id: int,
+                                  destination_app_id: int) -> Set[str]:
+        mask = self._grants.get((user_id, requesting_app_id, destination_app_id), 0)
+        bits = self._capability_bits.get(destination_app_id, {})
+        return {cap for cap, bit in bits.items() if mask & (1 << bit)}
+
+    def revoke_consent(self, user_id: str, requesting_app_id: int,
+                      destination_app_id: int, capability: str) -> bool:
+        with self._lock:
+            key = (user_id, requesting_app_id, destination_app_id)
+            mask = self._grants.get(key, 0)
+            bit = self._capability_bits.get(destination_app_id, {}).get(capability)
+            if bit is None or not mask & (1 << bit):
+                return False
+            mask &= ~(1 << bit)
+            self._drop_row(key, bit)
+            if mask:
+                self._grants[key] = mask
+            else:
+                self._drop_key(key)
+            self._record_change('revoke', user_id, requesting_app_id, destination_app_id, capability=capability)
+            return True
+
+    def revoke_all_user_consent(self, user_id: str) -> int:
+        with self._lock:
+            count = sum(self._drop_key(key) for key in list(self._keys_by_user.get(user_id, ())))
+            self._record_change('revoke_user', user_id)
+            return count
+
+    def revoke_all_consent(self) -> int:
+        with self._lock:
+            count = len(self._grant_rows)
+            self._grants.clear()
+            self._grant_rows.clear()
+            self._keys_by_user.clear()
+            self._rows_by_user.clear()
+            self._record_change('revoke_all')
+            return count
+
+    def delete_consents_chunk(self, user_id: Optional[str] = None, app_id: Optional[int] = None,
+                              limit: int = 1000) -> int:
+        with self._lock:
+            if user_id is not None:
+                keys = self._keys_by_user.get(user_id, ())
+            elif app_id is not None:
+                keys = (key for key in self._grants if key[1] == app_id or key[2] == app_id)
+            else:
+                keys = self._grants
+            # Whole grant masks are dropped, so a chunk may run slightly over limit
+            chunk = []
+            for key in keys:
+                if len(chunk) >= limit:
+                    break
+                chunk.append(key)
+            return sum(self._drop_key(key) for key in chunk)
+
+    def list_user_consents(self, user_id: str, limit: Optional[int] = None,
+                           after: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._rows_by_user.get(user_id, [])
+            # Newest first, so walk down from the cursor's position
+            end = len(rows) if after is None else bisect_left(rows, tuple(after))
+            consents = []
+            for i in range(end - 1, -1, -1):
+                if limit is not None and len(consents) >= limit:
+                    break
+                granted_at, consent_id, (_, requesting_app_id, destination_app_id), capability = rows[i]
+                requesting_app = self._applications.get(requesting_app_id)
+                destination_app = self._applications.get(destination_app_id)
+                if requesting_app is None or destination_app is None:
+                    continue
+                consents.append({
+                    "id": consent_id,
+                    "user_id": user_id,
+                    "requesting_app_id": requesting_app_id,
+                    "destination_app_id": destination_app_id,
+                    "capability": capability,
+                    "granted_at": granted_at,
+                    "requesting_app_name": requesting_app['name'],
+                    "destination_app_name": destination_app['name']
+                })
+            return consents
+
+    def list_changes(self, since: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        with self._lock:
+            start = max(since - self._change_base, 0)
+            return [dict(change) for change in self._changes[start:start + limit]]
+
+    def last_change_seq(self) -> int:
+        return self._change_base + len(self._changes)
+
+    def export_records(self) -> Iterator[Dict[str, Any]]:
+        # Copy under the lock so the snapshot is consistent; the data is in memory already
+        with self._lock:
+            records = [
+                {"type": "application", "id": app['id'], "name": app['name'], "created_at": app['created_at']}
+                for app in sorted(self._applications.values(), key=lambda app: app['id'])
+            ]
+            records.extend(
+                {"type": "capability", "application_id": app_id, "capability": capability}
+                for app_id in sorted(self._capabilities)
+                for capability in sorted(self._capabilities[app_id])
+            )
+            names = {app_id: {bit: cap for cap, bit in bits.items()}
+                     for app_id, bits in self._capability_bits.items()}
+            consents = []
+            for (key, bit), (consent_id, granted_at) in self._grant_rows.items():
+                user_id, requesting_app_id, destination_app_id = key
+                if requesting_app_id not in self._applications:
+                    continue
+                consents.append((consent_id, {
+                    "type": "consent",
+                    "user_id": user_id,
+                    "requesting_app_id": requesting_app_id,
+                    "destination_app_id": destination_app_id,
+                    "capability": names[destination_app_id][bit],
+                    "granted_at": granted_at
+                }))
+        consents.sort(key=lambda consent: consent[0])
+        yield from records
+        for _, consent in consents:
+            yield consent
+
+    def begin_restore(self):
+        with self._lock:
+            self._applications.clear()
+            self._application_ids.clear()
+            self._capabilities.clear()
+            self._capability_bits.clear()
+            self._grants.clear()
+            self._grant_rows.clear()
+            self._keys_by_user.clear()
+            self._rows_by_user.clear()
+            self._next_app_id = 1
+
+    def restore_records(self, records: List[Dict[str, Any]]) -> int:
+        with self._lock:
+            loaded = 0
+            for record in records:
+                if record['type'] == 'application':
+                    if record['id'] in self._applications or record['name'] in self._application_ids:
+                        continue
+                    self._add_application({
+                        "id": record['id'],
+                        "name": record['name'],
+                        "created_at": record.get('created_at') or self._now()
+                    })
+                    loaded += 1
+                elif record['type'] == 'capability':
+                    # finish_restore records the single 'restore' change, as in SQLiteRepository
+                    loaded += self._add_capability(record['application_id'], record['capability'])
+                elif record['type'] == 'consent':
+                    if record['capability'] not in self._capabilities.get(record['destination_app_id'], ()):
+                        continue
+                    key = (record['user_id'], record['requesting_app_id'], record['destination_app_id'])
+                    granted_at = record.get('granted_at') or self._now()
+                    loaded += self._grant(key, record['capability'], self._next_consent_id, granted_at)
+            return loaded
+
+    def finish_restore(self):
+        with self._lock:
+            self._record_change('restore')
+
+    def warm_up(self) -> int:
+        # Everything is in memory already
+        return 0
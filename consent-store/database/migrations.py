@@ -0,0 +1,134 @@
+import logging
+import sqlite3
+from typing import Callable, List, Tuple
+
+# Each migration upgrades the schema from (version - 1) to version.
+# The current version is kept in PRAGMA user_version.
+Migration = Tuple[int, str, Callable[[sqlite3.Connection], None]]
+
+logger = logging.getLogger("consent_store.migrations")
+
+def _intern_consent_capabilities(conn: sqlite3.Connection):
+    """Store user_consents.capability as an integer reference to capabilities.id"""
+    # Grants can outlive the capability they name. They were never valid, so they are
+    # dropped below rather than turning the name back into a grantable capability
+    orphaned = conn.execute('''
+        SELECT COUNT(*) FROM user_consents uc
+        WHERE NOT EXISTS (
+            SELECT 1 FROM capabilities c
+            WHERE c.application_id = uc.destination_app_id AND c.capability = uc.capability
+        )
+    ''').fetchone()[0]
+    if orphaned:
+        logger.warning("Dropping %d consents whose capability or destination application no longer exists",
+                       orphaned)
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'user_consents'").fetchone()
+    last_id = row[0] if row else 0
+    conn.execute('''
+        CREATE TABLE user_consents_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            requesting_app_id INTEGER NOT NULL,
+            destination_app_id INTEGER NOT NULL,
+            capability_id INTEGER NOT NULL,
+            granted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (requesting_app_id) REFERENCES applications(id) ON DELETE CASCADE,
+            FOREIGN KEY (destination_app_id) REFERENCES applications(id) ON DELETE CASCADE,
+            FOREIGN KEY (capability_id) REFERENCES capabilities(id) ON DELETE CASCADE,
+            UNIQUE(user_id, requesting_app_id, destination_app_id, capability_id)
+        )
+    ''')
+    # Rows whose capability or destination application no longer exists are dropped by the join
+    conn.execute('''
+        INSERT INTO user_consents_new
+        (id, user_id, requesting_app_id, destination_app_id, capability_id, granted_at)
+        SELECT uc.id, uc.user_id, uc.requesting_app_id, uc.destination_app_id, c.id, uc.granted_at
+        FROM user_consents uc
+        JOIN capabilities c ON c.application_id = uc.destination_app_id AND c.capability = uc.capability
+    ''')
+    conn.execute('DROP TABLE user_consents')
+    conn.execute('ALTER TABLE user_consents_new RENAME TO user_consents')
+    conn.execute('CREATE INDEX idx_user_consents_user_id ON user_consents(user_id)')
+    # Keep AUTOINCREMENT from reusing ids of consents deleted before the migration
+    updated = conn.execute(
+        "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'user_consents'",
+        (last_id,)
+    ).rowcount
+    # An empty new table has no sqlite_sequence row yet
+    if not updated and last_id:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('user_consents', ?)", (last_id,))
+
+def _index_consents_by_user_and_time(conn: sqlite3.Connection):
+    """Serve per-user listings and their (granted_at, id) keyset cursors straight from an index"""
+    conn.execute('DROP INDEX IF EXISTS idx_user_consents_user_id')
+    conn.execute('CREATE INDEX idx_user_consents_user_granted ON user_consents(user_id, granted_at)')
+
+def _add_consent_changes(conn: sqlite3.Connection):
+    """Log every consent change under a monotonically increasing sequence number"""
+    conn.execute('''
+        CREATE TABLE consent_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            user_id TEXT,
+            requesting_app_id INTEGER,
+            destination_app_id INTEGER,
+            application_id INTEGER,
+            capability TEXT,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _enforce_consent_references(conn: sqlite3.Connection):
+    """Index every foreign key of user_consents and purge rows orphaned before foreign keys were enforced"""
+    # Without these, each cascading delete from applications or capabilities scans user_consents
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_consents_requesting ON user_consents(requesting_app_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_consents_destination ON user_consents(destination_app_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_consents_capability ON user_consents(capability_id)')
+    conn.execute('DELETE FROM capabilities WHERE application_id NOT IN (SELECT id FROM applications)')
+    conn.execute('''
+        DELETE FROM user_consents
+        WHERE requesting_app_id NOT IN (SELECT id FROM applications)
+        OR destination_app_id NOT IN (SELECT id FROM applications)
+        OR capability_id NOT IN (SELECT id FROM capabilities)
+    ''')
+
+def _add_shared_versions(conn: sqlite3.Connection):
+    """Give the store a random id and index the change feed by user, so every process
+    sharing the file can derive the same listing versions from it"""
+    conn.execute('CREATE INDEX idx_consent_changes_user ON consent_changes(user_id)')
+    conn.execute('CREATE TABLE store_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+    conn.execute("INSERT INTO store_meta (name, value) VALUES ('store_id', lower(hex(randomblob(4))))")
+
+MIGRATIONS: List[Migration] = [
+    (1, "intern user_consents.capability as capabilities.id", _intern_consent_capabilities),
+    (2, "index user_consents by (user_id, granted_at)", _index_consents_by_user_and_time),
+    (3, "add consent_changes feed", _add_consent_changes),
+    (4, "index user_consents foreign keys and purge orphans", _enforce_consent_references),
+    (5, "add store id and index consent_changes by user", _add_shared_versions),
+]
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn: sqlite3.Connection, migrations: List[Migration] = MIGRATIONS) -> int:
+    """Apply pending migrations, each in its own transaction, and return the resulting version"""
+    # Table rebuilds must not trip foreign key checks; the pragma only takes effect outside a transaction
+    foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+    conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for version, description, apply in sorted(migrations, key=lambda migration: migration[0]):
+            if schema_version(conn) >= version:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have applied it while we waited for the write lock
+                if schema_version(conn) < version:
+                    apply(conn)
+                    conn.execute(f'PRAGMA user_version = {int(version)}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+    finally:
+        conn.execute(f'PRAGMA foreign_keys = {int(foreign_keys)}')
+    return schema_version(conn)
@@ -0,0 +1,124 @@
+import logging
+import re
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("consent_store.sql")
+
+# Statements EXPLAIN QUERY PLAN can describe
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+_WHITESPACE = re.compile(r"\s+")
+# IN (?, ?, ?) lists, whose length varies with the call
+_PLACEHOLDER_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
+def statement_shape(sql: str) -> str:
+    """Normalize a statement so calls that differ only in layout or IN list length share one entry"""
+    return _PLACEHOLDER_LIST.sub("IN (?, ...)", _WHITESPACE.sub(" ", sql).strip())
+
+class StatementStats:
+    def __init__(self, shape: str, plan: List[str]):
+        self.shape = shape
+        self.plan = plan
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "shape": self.shape,
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.count if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "plan": self.plan
+        }
+
+class StatementProfiler:
+    """Aggregates SQLite statement timings by statement shape.
+
+    The query plan of each shape is captured with EXPLAIN QUERY PLAN the first
+    time it runs. Statements slower than slow_ms are logged with their plan and
+    kept in a ring of the last max_slow. Parameters are never recorded, since
+    they carry user IDs.
+    """
+
+    def __init__(self, slow_ms: float = 50, max_slow: int = 100, max_shapes: int = 1000):
+        self.slow = slow_ms / 1000
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        self._stats: Dict[str, StatementStats] = {}
+        self._slow_log: deque = deque(maxlen=max_slow)
+
+    def record(self, conn: sqlite3.Connection, sql: str, parameters: Any, seconds: float,
+               many: bool = False) -> Optional[StatementStats]:
+        """Record one execution of sql and return its shape's stats, or None once max_shapes is reached"""
+        shape = statement_shape(sql)
+        stats = self._stats.get(shape)
+        if stats is None:
+            if len(self._stats) >= self.max_shapes:
+                return None
+            # Explaining outside the lock; a racing thread may explain the same shape twice
+            plan = explain(conn, sql, None if many else parameters)
+            with self._lock:
+                stats = self._stats.setdefault(shape, StatementStats(shape, plan))
+        with self._lock:
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+        if seconds >= self.slow:
+            self._log_slow(stats, seconds)
+        return stats
+
+    def add_fetch(self, stats: StatementStats, executed: float, fetched: float):
+        """Add time spent fetching rows to an execution already recorded with executed seconds"""
+        total = executed + fetched
+        with self._lock:
+            stats.total += fetched
+            stats.max = max(stats.max, total)
+        if executed < self.slow <= total:
+            self._log_slow(stats, total)
+
+    def _log_slow(self, stats: StatementStats, seconds: float):
+        logger.warning("Slow SQL statement (%.1f ms): %s | plan: %s",
+                       seconds * 1000, stats.shape, "; ".join(stats.plan))
+        self._slow_log.append({
+            "shape": stats.shape,
+            "ms": seconds * 1000,
+            "plan": stats.plan,
+            "at": datetime.utcnow()
+        })
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-shape aggregates, most total time first, and the slow statement log"""
+        with self._lock:
+            statements = [stats.to_dict() for stats in self._stats.values()]
+            slow = list(self._slow_log)
+        statements.sort(key=lambda stats: stats["total_ms"], reverse=True)
+        return {"slow_ms": self.slow * 1000, "statements": statements, "slow": slow}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow_log.clear()
+
+def explain(conn: sqlite3.Connection, sql: str, parameters: Any) -> List[str]:
+    """EXPLAIN QUERY PLAN lines for sql, indented by depth; without parameters every placeholder is NULL"""
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return []
+    if parameters is None:
+        parameters = [None] * sql.count("?")
+    try:
+        # The base class method, so explaining is not itself profiled
+        rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+    except sqlite3.Error as e:
+        return [f"unavailable: {e}"]
+
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
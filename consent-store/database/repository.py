@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set, Tuple, Iterable, Iterator
 
 class DatabaseRepository(ABC):
     """Abstract base class for database operations"""
@@ -20,10 +20,30 @@ class DatabaseRepository(ABC):
         pass
     
     @abstractmethod
-    def list_applications(self) -> List[Dict[str, Any]]:
-        """List all applications"""
+    def list_applications(self, limit: Optional[int] = None,
+                          after: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List applications ordered by name; with limit/after, return the keyset page after that name"""
         pass
     
+    @abstractmethod
+    def list_applications_with_capabilities(self, limit: Optional[int] = None,
+                                            after: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Like list_applications, with each application's sorted capabilities under 'capabilities',
+        read in one query"""
+        pass
+    
+    def iter_applications(self, page_size: int = 500, after: Optional[str] = None,
+                          with_capabilities: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield every application page by page, so memory use stays flat"""
+        list_page = self.list_applications_with_capabilities if with_capabilities else self.list_applications
+        while True:
+            page = list_page(limit=page_size, after=after)
+            if page:
+                after = page[-1]['name']
+            yield from page
+            if len(page) < page_size:
+                return
+    
     @abstractmethod
     def delete_application(self, app_id: int) -> bool:
         """Delete an application and all its related data"""
@@ -50,12 +70,51 @@ class DatabaseRepository(ABC):
         """Grant user consent for an app to use another app's capability"""
         pass
     
+    @abstractmethod
+    def grant_consents_bulk(self, grants: Iterable[Tuple[str, int, int, str]]) -> int:
+        """Grant many (user_id, requesting_app_id, destination_app_id, capability) consents
+        in one transaction, skipping ones that already exist; return the number newly granted"""
+        pass
+    
+    @abstractmethod
+    def grant_consent_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                              capabilities: List[str]) -> Dict[str, Any]:
+        """Resolve both applications by name, check each capability belongs to the destination and
+        grant them all in one transaction. Returns requesting_app_id and destination_app_id (None if
+        that application does not exist) and the newly_granted, already_granted and unknown
+        capabilities; nothing is granted unless both applications exist and unknown is empty"""
+        pass
+    
+    @abstractmethod
+    def grant_consents_by_name(self, grants: List[Tuple[str, str, str, List[str]]]) -> List[Dict[str, Any]]:
+        """grant_consent_by_name for each (user_id, requesting_app_name, destination_app_name,
+        capabilities) in order, all in one transaction; returns each one's result"""
+        pass
+    
+    @abstractmethod
+    def apply_consent_writes(self, writes: List[Tuple[str, str, int, int, str]]) -> List[bool]:
+        """Apply ('grant' or 'revoke', user_id, requesting_app_id, destination_app_id, capability)
+        writes in order in one transaction; return whether each one changed anything"""
+        pass
+    
     @abstractmethod
     def check_consent(self, user_id: str, requesting_app_id: int,
                      destination_app_id: int, capabilities: List[str]) -> Dict[str, bool]:
         """Check if user has granted consent for specific capabilities"""
         pass
     
+    @abstractmethod
+    def check_consent_batch(self, checks: List[Tuple[str, int, int, List[str]]]) -> List[Dict[str, bool]]:
+        """Check many (user_id, requesting_app_id, destination_app_id, capabilities) tuples at once,
+        returning one result per tuple in input order"""
+        pass
+    
+    @abstractmethod
+    def list_granted_capabilities(self, user_id: str, requesting_app_id: int,
+                                  destination_app_id: int) -> Set[str]:
+        """List every capability the user has granted for an app pair"""
+        pass
+    
     @abstractmethod
     def revoke_consent(self, user_id: str, requesting_app_id: int,
                       destination_app_id: int, capability: str) -> bool:
@@ -73,6 +132,64 @@ class DatabaseRepository(ABC):
         pass
     
     @abstractmethod
-    def list_user_consents(self, user_id: str) -> List[Dict[str, Any]]:
-        """List all consents for a specific user"""
-        pass
\ No newline at end of file
+    def list_user_consents(self, user_id: str, limit: Optional[int] = None,
+                           after: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        """List consents for a specific user, newest first; with limit/after, return the
+        keyset page following the (granted_at, id) cursor"""
+        pass
+    
+    def iter_user_consents(self, user_id: str, page_size: int = 500,
+                           after: Optional[Tuple[str, int]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield every consent of a user page by page, so memory use stays flat"""
+        while True:
+            page = self.list_user_consents(user_id, limit=page_size, after=after)
+            # Take the cursor before handing the rows out, in case a consumer changes them
+            if page:
+                after = (page[-1]['granted_at'], page[-1]['id'])
+            yield from page
+            if len(page) < page_size:
+                return
+    
+    @abstractmethod
+    def delete_consents_chunk(self, user_id: Optional[str] = None, app_id: Optional[int] = None,
+                              limit: int = 1000) -> int:
+        """Delete up to limit consents of a user, of an application (either side) or, with neither,
+        of everyone; return the number deleted. Records no change, so callers finish with the
+        matching revoke or delete call"""
+        pass
+    
+    @abstractmethod
+    def list_changes(self, since: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        """List recorded consent changes with a sequence number above since, oldest first"""
+        pass
+    
+    @abstractmethod
+    def last_change_seq(self) -> int:
+        """Return the sequence number of the latest recorded change, 0 if there is none"""
+        pass
+    
+    @abstractmethod
+    def export_records(self) -> Iterator[Dict[str, Any]]:
+        """Yield every application, capability and consent as snapshot records read from one
+        consistent state, in that order"""
+        pass
+    
+    @abstractmethod
+    def begin_restore(self):
+        """Remove all data and defer index maintenance ahead of restore_records"""
+        pass
+    
+    @abstractmethod
+    def restore_records(self, records: List[Dict[str, Any]]) -> int:
+        """Load a chunk of snapshot records in one transaction, return the number loaded"""
+        pass
+    
+    @abstractmethod
+    def finish_restore(self):
+        """Rebuild whatever begin_restore deferred"""
+        pass
+    
+    @abstractmethod
+    def warm_up(self) -> int:
+        """Read the indexes consent checks use into the page cache, return the number of consent entries read"""
+        pass
@@ -0,0 +1,534 @@
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import List, Optional, Dict, Any, Set, Tuple, Iterable, Iterator
+from database.repository import DatabaseRepository
+from database.sqlite_repository import SQLiteRepository
+from database.connection import SQLiteConnectionManager
+from database.profiling import StatementProfiler
+
+class ShardedSQLiteRepository(DatabaseRepository):
+    """Repository that hash-partitions user_consents by user_id across several SQLite files.
+
+    The applications/capabilities catalog lives in the shared db_path file, and
+    consent rows live in '<db_path stem>.shard<N>.db'. Operations for a single
+    user touch exactly one shard. Cross-user operations fan out to all shards
+    in parallel. Shards cannot reference the catalog file with foreign keys, so
+    application deletion removes the matching consent rows explicitly. The
+    change feed lives in the catalog file and is appended after each shard
+    write commits.
+    """
+
+    def __init__(self, db_path: str = "consent_store.db", shards: int = 4, pooled: bool = True,
+                 cache_size_kib: int = 16384, mmap_size: int = 268435456,
+                 profiler: Optional[StatementProfiler] = None):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.db_path = db_path
+        self.catalog = SQLiteRepository(db_path, pooled=pooled, cache_size_kib=cache_size_kib,
+                                        mmap_size=mmap_size, profiler=profiler)
+        root, ext = os.path.splitext(db_path)
+        self._shards = [
+            SQLiteConnectionManager(f"{root}.shard{i}{ext or '.db'}", pooled=pooled,
+                                    cache_size_kib=cache_size_kib, mmap_size=mmap_size,
+                                    profiler=profiler)
+            for i in range(shards)
+        ]
+        self._executor = ThreadPoolExecutor(max_workers=shards, thread_name_prefix="consent-shard")
+        for shard in self._shards:
+            self._initialize_shard(shard)
+
+    SHARD_INDEXES = {
+        'idx_user_consents_user_granted':
+            'CREATE INDEX IF NOT EXISTS idx_user_consents_user_granted ON user_consents(user_id, granted_at)',
+        'idx_user_consents_destination':
+            'CREATE INDEX IF NOT EXISTS idx_user_consents_destination ON user_consents(destination_app_id)',
+        'idx_user_consents_requesting':
+            'CREATE INDEX IF NOT EXISTS idx_user_consents_requesting ON user_consents(requesting_app_id)',
+    }
+
+    def _initialize_shard(self, shard: SQLiteConnectionManager):
+        with shard.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_consents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    requesting_app_id INTEGER NOT NULL,
+                    destination_app_id INTEGER NOT NULL,
+                    capability TEXT NOT NULL,
+                    granted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, requesting_app_id, destination_app_id, capability)
+                )
+            ''')
+            for create in self.SHARD_INDEXES.values():
+                cursor.execute(create)
+
+    def _shard_index(self, user_id: str) -> int:
+        return zlib.crc32(user_id.encode('utf-8')) % len(self._shards)
+
+    def _shard(self, user_id: str) -> SQLiteConnectionManager:
+        return self._shards[self._shard_index(user_id)]
+
+    def _grantable(self, grants: Iterable[Tuple[str, int, int, str]]) -> List[bool]:
+        """Whether each (user_id, requesting_app_id, destination_app_id, capability) passes the checks
+        SQLiteRepository.GRANT_SQL makes, which shards cannot make against the catalog file themselves"""
+        exists: Dict[int, bool] = {}
+        capabilities: Dict[int, Set[str]] = {}
+        results = []
+        for _, requesting_app_id, destination_app_id, capability in grants:
+            if requesting_app_id not in exists:
+                exists[requesting_app_id] = self.catalog.get_application(requesting_app_id) is not None
+            if destination_app_id not in capabilities:
+                capabilities[destination_app_id] = set(self.catalog.list_capabilities(destination_app_id))
+            results.append(exists[requesting_app_id] and capability in capabilities[destination_app_id])
+        return results
+
+    def _fan_out(self, func) -> list:
+        """Run func(shard) on every shard in parallel and return the results in shard order"""
+        return list(self._executor.map(func, self._shards))
+
+    def _by_shard(self, items: Iterable[tuple]) -> Dict[int, List[tuple]]:
+        groups: Dict[int, List[tuple]] = {}
+        for item in items:
+            groups.setdefault(self._shard_index(item[0]), []).append(item)
+        return groups
+
+    # Catalog operations go to the shared file
+
+    def create_application(self, name: str) -> int:
+        return self.catalog.create_application(name)
+
+    def get_application(self, app_id: int) -> Optional[Dict[str, Any]]:
+        return self.catalog.get_application(app_id)
+
+    def get_application_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.catalog.get_application_by_name(name)
+
+    def list_applications(self, limit: Optional[int] = None,
+                          after: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.catalog.list_applications(limit, after)
+
+    def list_applications_with_capabilities(self, limit: Optional[int] = None,
+                                            after: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.catalog.list_applications_with_capabilities(limit, after)
+
+    def delete_application(self, app_id: int) -> bool:
+        deleted = self.catalog.delete_application(app_id)
+
+        def delete_consents(shard: SQLiteConnectionManager):
+            with shard.connection() as conn:
+                conn.execute(
+                    'DELETE FROM user_consents WHERE requesting_app_id = ? OR destination_app_id = ?',
+                    (app_id, app_id)
+                )
+
+        self._fan_out(delete_consents)
+        return deleted
+
+    def add_capability(self, app_id: int, capability: str) -> bool:
+        return self.catalog.add_capability(app_id, capability)
+
+    def remove_capability(self, app_id: int, capability: str) -> bool:
+        removed = self.catalog.remove_capability(app_id, capability)
+
+        def delete_consents(shard: SQLiteConnectionManager):
+            with shard.connection() as conn:
+                conn.execute(
+                    'DELETE FROM user_consents WHERE destination_app_id = ? AND capability = ?',
+                    (app_id, capability)
+                )
+
+        # Removing a capability revokes its grants, matching SQLiteRepository
+        if removed:
+            self._fan_out(delete_consents)
+        return removed
+
+    def list_capabilities(self, app_id: int) -> List[str]:
+        return self.catalog.list_capabilities(app_id)
+
+    # Consent operations are routed by user_id
+
+    def grant_consent(self, user_id: str, requesting_app_id: int,
+                     destination_app_id: int, capability: str) -> bool:
+        return self.grant_consents_bulk([(user_id, requesting_app_id, destination_app_id, capability)]) > 0
+
+    def grant_consent_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                              capabilities: List[str]) -> Dict[str, Any]:
+        return self.grant_consents_by_name([(user_id, requesting_app_name, destination_app_name, capabilities)])[0]
+
+    def grant_consents_by_name(self, grants: List[Tuple[str, str, str, List[str]]]) -> List[Dict[str, Any]]:
+        # The catalog and the shards are separate files, so validation and the grants cannot share a transaction
+        results = []
+        valid: List[Tuple[str, int, List[str]]] = []
+        for index, (user_id, requesting_app_name, destination_app_name, capabilities) in enumerate(grants):
+            capabilities = list(dict.fromkeys(capabilities))
+            requesting_app = self.catalog.get_application_by_name(requesting_app_name)
+            destination_app = self.catalog.get_application_by_name(destination_app_name)
+            result = {
+                "requesting_app_id": requesting_app['id'] if requesting_app else None,
+                "destination_app_id": destination_app['id'] if destination_app else None,
+                "newly_granted": [],
+                "already_granted": [],
+                "unknown": []
+            }
+            results.append(result)
+            if requesting_app is None or destination_app is None:
+                continue
+            known = set(self.catalog.list_capabilities(destination_app['id']))
+            result['unknown'] = [cap for cap in capabilities if cap not in known]
+            if not result['unknown']:
+                valid.append((user_id, index, capabilities))
+        groups = self._by_shard(valid)
+
+        def grant(shard_index: int):
+            # One transaction per shard; a user's requests all land on one shard, so their order is kept
+            with self._shards[shard_index].connection() as conn:
+                cursor = conn.cursor()
+                for user_id, index, capabilities in groups[shard_index]:
+                    result = results[index]
+                    for cap in capabilities:
+                        cursor.execute('''
+                            INSERT OR IGNORE INTO user_consents
+                            (user_id, requesting_app_id, destination_app_id, capability)
+                            VALUES (?, ?, ?, ?)
+                        ''', (user_id, result['requesting_app_id'], result['destination_app_id'], cap))
+                        result['newly_granted' if cursor.rowcount > 0 else 'already_granted'].append(cap)
+
+        if len(groups) == 1:
+            grant(next(iter(groups)))
+        elif groups:
+            list(self._executor.map(grant, groups))
+        changes = [('grant', user_id, results[index]['requesting_app_id'], results[index]['destination_app_id'],
+                    None, cap)
+                   for user_id, index, _ in valid for cap in results[index]['newly_granted']]
+        if changes:
+            self.catalog.record_changes(changes)
+        return results
+
+    def grant_consents_bulk(self, grants: Iterable[Tuple[str, int, int, str]]) -> int:
+        grants = list(grants)
+        groups = self._by_shard(grant for grant, valid in zip(grants, self._grantable(grants)) if valid)
+        if not groups:
+            return 0
+
+        def grant(index: int) -> List[tuple]:
+            with self._shards[index].connection() as conn:
+                cursor = conn.cursor()
+                # Take the write lock first so every row above last_id is ours
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('SELECT COALESCE(MAX(id), 0) FROM user_consents')
+                last_id = cursor.fetchone()[0]
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO user_consents
+                    (user_id, requesting_app_id, destination_app_id, capability)
+                    VALUES (?, ?, ?, ?)
+                ''', groups[index])
+                if cursor.rowcount <= 0:
+                    return []
+                cursor.execute('''
+                    SELECT 'grant', user_id, requesting_app_id, destination_app_id, NULL, capability
+                    FROM user_consents WHERE id > ? ORDER BY id
+                ''', (last_id,))
+                return [tuple(row) for row in cursor.fetchall()]
+
+        if len(groups) == 1:
+            changes = grant(next(iter(groups)))
+        else:
+            changes = [change for shard_changes in self._executor.map(grant, groups) for change in shard_changes]
+        if changes:
+            self.catalog.record_changes(changes)
+        return len(changes)
+
+    def apply_consent_writes(self, writes: List[Tuple[str, str, int, int, str]]) -> List[bool]:
+        for write in writes:
+            if write[0] not in ('grant', 'revoke'):
+                raise ValueError(f"Unknown consent write '{write[0]}'")
+        results = [False] * len(writes)
+        grantable = iter(self._grantable([write[1:] for write in writes if write[0] == 'grant']))
+        # A user's writes all land on one shard, so their order is kept; invalid grants change nothing
+        groups = self._by_shard(
+            (user_id, index, kind, requesting_app_id, destination_app_id, capability)
+            for index, (kind, user_id, requesting_app_id, destination_app_id, capability) in enumerate(writes)
+            if kind != 'grant' or next(grantable)
+        )
+
+        def apply(shard_index: int) -> List[int]:
+            changed = []
+            with self._shards[shard_index].connection() as conn:
+                cursor = conn.cursor()
+                for user_id, index, kind, requesting_app_id, destination_app_id, capability in groups[shard_index]:
+                    if kind == 'grant':
+                        cursor.execute('''
+                            INSERT OR IGNORE INTO user_consents
+                            (user_id, requesting_app_id, destination_app_id, capability)
+                            VALUES (?, ?, ?, ?)
+                        ''', (user_id, requesting_app_id, destination_app_id, capability))
+                    else:
+                        cursor.execute('''
+                            DELETE FROM user_consents
+                            WHERE user_id = ? AND requesting_app_id = ?
+                            AND destination_app_id = ? AND capability = ?
+                        ''', (user_id, requesting_app_id, destination_app_id, capability))
+                    if cursor.rowcount > 0:
+                        changed.append(index)
+            return changed
+
+        for changed in self._executor.map(apply, groups):
+            for index in changed:
+                results[index] = True
+        changes = [(kind, user_id, requesting_app_id, destination_app_id, None, capability)
+                   for (kind, user_id, requesting_app_id, destination_app_id, capability), changed
+                   in zip(writes, results) if changed]
+        if changes:
+            self.catalog.record_changes(changes)
+        return results
+
+    def check_consent(self, user_id: str, requesting_app_id: int,
+                     destination_app_id: int, capabilities: List[str]) -> Dict[str, bool]:
+        granted = self.list_granted_capabilities(user_id, requesting_app_id, destination_app_id)
+        return {cap: cap in granted for cap in capabilities}
+
+    def check_consent_batch(self, checks: List[Tuple[str, int, int, List[str]]]) -> List[Dict[str, bool]]:
+        results = [{cap: False for cap in capabilities} for _, _, _, capabilities in checks]
+        groups = self._by_shard(
+            (user_id, item, requesting_app_id, destination_app_id, cap)
+            for item, (user_id, requesting_app_id, destination_app_id, capabilities) in enumerate(checks)
+            for cap in capabilities
+        )
+
+        def check(index: int) -> List[Tuple[int, str]]:
+            with self._shards[index].connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    CREATE TEMP TABLE IF NOT EXISTS consent_check_batch (
+                        user_id TEXT NOT NULL,
+                        item INTEGER NOT NULL,
+                        requesting_app_id INTEGER NOT NULL,
+                        destination_app_id INTEGER NOT NULL,
+                        capability TEXT NOT NULL
+                    )
+                ''')
+                try:
+                    cursor.executemany('''
+                        INSERT INTO consent_check_batch
+                        (user_id, item, requesting_app_id, destination_app_id, capability)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', groups[index])
+                    cursor.execute('''
+                        SELECT b.item, b.capability FROM consent_check_batch b
+                        JOIN user_consents uc
+                        ON uc.user_id = b.user_id AND uc.requesting_app_id = b.requesting_app_id
+                        AND uc.destination_app_id = b.destination_app_id AND uc.capability = b.capability
+                    ''')
+                    return [(row['item'], row['capability']) for row in cursor.fetchall()]
+                finally:
+                    cursor.execute('DELETE FROM consent_check_batch')
+
+        for matches in self._executor.map(check, groups):
+            for item, capability in matches:
+                results[item][capability] = True
+        return results
+
+    def list_granted_capabilities(self, user_id: str, requesting_app_id: int,
+                                  destination_app_id: int) -> Set[str]:
+        with self._shard(user_id).connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT capability FROM user_consents
+                WHERE user_id = ? AND requesting_app_id = ? AND destination_app_id = ?
+            ''', (user_id, requesting_app_id, destination_app_id))
+            return {row['capability'] for row in cursor.fetchall()}
+
+    def revoke_consent(self, user_id: str, requesting_app_id: int,
+                      destination_app_id: int, capability: str) -> bool:
+        with self._shard(user_id).connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM user_consents
+                WHERE user_id = ? AND requesting_app_id = ?
+                AND destination_app_id = ? AND capability = ?
+            ''', (user_id, requesting_app_id, destination_app_id, capability))
+            revoked = cursor.rowcount > 0
+        if revoked:
+            self.catalog.record_changes([('revoke', user_id, requesting_app_id, destination_app_id, None, capability)])
+        return revoked
+
+    def revoke_all_user_consent(self, user_id: str) -> int:
+        with self._shard(user_id).connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM user_consents WHERE user_id = ?', (user_id,))
+            count = cursor.rowcount
+        self.catalog.record_changes([('revoke_user', user_id, None, None, None, None)])
+        return count
+
+    def revoke_all_consent(self) -> int:
+        def revoke(shard: SQLiteConnectionManager) -> int:
+            with shard.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM user_consents')
+                return cursor.rowcount
+
+        count = sum(self._fan_out(revoke))
+        self.catalog.record_changes([('revoke_all', None, None, None, None, None)])
+        return count
+
+    def delete_consents_chunk(self, user_id: Optional[str] = None, app_id: Optional[int] = None,
+                              limit: int = 1000) -> int:
+        if user_id is not None:
+            where, params = 'user_id = ?', (user_id,)
+        elif app_id is not None:
+            where, params = 'requesting_app_id = ? OR destination_app_id = ?', (app_id, app_id)
+        else:
+            where, params = '1', ()
+
+        def delete(shard: SQLiteConnectionManager) -> int:
+            with shard.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f'DELETE FROM user_consents WHERE id IN (SELECT id FROM user_consents WHERE {where} LIMIT ?)',
+                    params + (limit,)
+                )
+                return cursor.rowcount
+
+        if user_id is not None:
+            return delete(self._shard(user_id))
+        # Every shard deletes its own chunk in parallel
+        return sum(self._fan_out(delete))
+
+    def list_user_consents(self, user_id: str, limit: Optional[int] = None,
+                           after: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        names: Dict[int, Optional[str]] = {}
+
+        def name(app_id: int) -> Optional[str]:
+            if app_id not in names:
+                app = self.catalog.get_application(app_id)
+                names[app_id] = app['name'] if app else None
+            return names[app_id]
+
+        # Rows whose applications are gone are dropped after the shard query, so keep
+        # reading until the page is full or the shard has no more rows
+        consents = []
+        with self._shard(user_id).connection() as conn:
+            cursor = conn.cursor()
+            while True:
+                after_granted_at, after_id = after if after else (None, None)
+                wanted = -1 if limit is None else limit - len(consents)
+                cursor.execute('''
+                    SELECT * FROM user_consents
+                    WHERE user_id = ?
+                    AND (? IS NULL OR (granted_at, id) < (?, ?))
+                    ORDER BY granted_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, after_granted_at, after_granted_at, after_id, wanted))
+                rows = [dict(row) for row in cursor.fetchall()]
+                for row in rows:
+                    row['requesting_app_name'] = name(row['requesting_app_id'])
+                    row['destination_app_name'] = name(row['destination_app_id'])
+                    if row['requesting_app_name'] is not None and row['destination_app_name'] is not None:
+                        consents.append(row)
+                if limit is None or len(rows) < wanted or len(consents) >= limit:
+                    return consents
+                after = (rows[-1]['granted_at'], rows[-1]['id'])
+
+    def list_changes(self, since: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        return self.catalog.list_changes(since, limit)
+
+    def last_change_seq(self) -> int:
+        return self.catalog.last_change_seq()
+
+    def export_records(self) -> Iterator[Dict[str, Any]]:
+        with ExitStack() as stack:
+            # Take every file's snapshot before streaming anything, so they agree as closely as possible
+            catalog = stack.enter_context(self.catalog.snapshot())
+            shards = [stack.enter_context(shard.snapshot()) for shard in self._shards]
+            application_ids = set()
+            capabilities = set()
+            for record in SQLiteRepository.export_catalog(catalog):
+                if record['type'] == 'application':
+                    application_ids.add(record['id'])
+                else:
+                    capabilities.add((record['application_id'], record['capability']))
+                yield record
+            for conn in shards:
+                for row in conn.execute('''
+                    SELECT user_id, requesting_app_id, destination_app_id, capability, granted_at
+                    FROM user_consents ORDER BY id
+                '''):
+                    # Skip rows whose application or capability is gone, as the SQLite joins would
+                    if row[1] not in application_ids or (row[2], row[3]) not in capabilities:
+                        continue
+                    yield {
+                        "type": "consent",
+                        "user_id": row[0],
+                        "requesting_app_id": row[1],
+                        "destination_app_id": row[2],
+                        "capability": row[3],
+                        "granted_at": row[4]
+                    }
+
+    def begin_restore(self):
+        self.catalog.begin_restore()
+
+        def clear(shard: SQLiteConnectionManager):
+            with shard.connection() as conn:
+                for index in self.SHARD_INDEXES:
+                    conn.execute(f'DROP INDEX IF EXISTS {index}')
+                conn.execute('DELETE FROM user_consents')
+
+        self._fan_out(clear)
+
+    def restore_records(self, records: List[Dict[str, Any]]) -> int:
+        loaded = self.catalog.restore_records([r for r in records if r['type'] != 'consent'])
+        consents = [r for r in records if r['type'] == 'consent']
+        if not consents:
+            return loaded
+
+        # Shards cannot join against the catalog, so drop grants of unknown capabilities here
+        known: Dict[int, Set[str]] = {}
+        for destination_app_id in {r['destination_app_id'] for r in consents}:
+            known[destination_app_id] = set(self.catalog.list_capabilities(destination_app_id))
+        groups = self._by_shard(
+            (r['user_id'], r['requesting_app_id'], r['destination_app_id'], r['capability'], r.get('granted_at'))
+            for r in consents if r['capability'] in known[r['destination_app_id']]
+        )
+
+        def restore(index: int) -> int:
+            with self._shards[index].connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO user_consents
+                    (user_id, requesting_app_id, destination_app_id, capability, granted_at)
+                    VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                ''', groups[index])
+                return cursor.rowcount
+
+        return loaded + sum(self._executor.map(restore, groups))
+
+    def finish_restore(self):
+        self.catalog.finish_restore()
+
+        def rebuild(shard: SQLiteConnectionManager):
+            self._initialize_shard(shard)
+            with shard.connection() as conn:
+                conn.execute('ANALYZE')
+
+        self._fan_out(rebuild)
+
+    def warm_up(self) -> int:
+        self.catalog.warm_up()
+
+        def warm(shard: SQLiteConnectionManager) -> int:
+            with shard.connection() as conn:
+                return conn.execute(
+                    'SELECT COUNT(capability) FROM user_consents INDEXED BY sqlite_autoindex_user_consents_1'
+                ).fetchone()[0]
+
+        return sum(self._fan_out(warm))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for shard in self._shards:
+            shard.close()
+        self.catalog.close()
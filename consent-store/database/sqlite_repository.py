@@ -1,76 +1,89 @@
 import sqlite3
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set, Tuple, Iterable, Iterator
 from contextlib import contextmanager
 import os
 from database.repository import DatabaseRepository
+from database.connection import SQLiteConnectionManager
+from database.profiling import StatementProfiler
+from database.migrations import migrate, schema_version
 
 class SQLiteRepository(DatabaseRepository):
-    def __init__(self, db_path: str = "consent_store.db"):
+    def __init__(self, db_path: str = "consent_store.db", pooled: bool = True,
+                 cache_size_kib: int = 16384, mmap_size: int = 268435456,
+                 profiler: Optional[StatementProfiler] = None):
         self.db_path = db_path
+        self._connections = SQLiteConnectionManager(
+            db_path,
+            pooled=pooled,
+            cache_size_kib=cache_size_kib,
+            mmap_size=mmap_size,
+            profiler=profiler
+        )
         self._initialize_database()
     
     @contextmanager
     def _get_connection(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        try:
+        with self._connections.connection() as conn:
             yield conn
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.close()
+    
+    def close(self):
+        """Release pooled connections"""
+        self._connections.close()
     
     def _initialize_database(self):
-        """Initialize database schema"""
+        """Create the version 0 schema on a new file, then apply pending migrations"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Create applications table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS applications (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create capabilities table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS capabilities (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    application_id INTEGER NOT NULL,
-                    capability TEXT NOT NULL,
-                    FOREIGN KEY (application_id) REFERENCES applications(id) ON DELETE CASCADE,
-                    UNIQUE(application_id, capability)
-                )
-            ''')
-            
-            # Create user_consents table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_consents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT NOT NULL,
-                    requesting_app_id INTEGER NOT NULL,
-                    destination_app_id INTEGER NOT NULL,
-                    capability TEXT NOT NULL,
-                    granted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (requesting_app_id) REFERENCES applications(id) ON DELETE CASCADE,
-                    FOREIGN KEY (destination_app_id) REFERENCES applications(id) ON DELETE CASCADE,
-                    UNIQUE(user_id, requesting_app_id, destination_app_id, capability)
-                )
-            ''')
-            
-            # Create indexes
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_consents_user_id ON user_consents(user_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_capabilities_app_id ON capabilities(application_id)')
+            if schema_version(conn) == 0:
+                cursor = conn.cursor()
+                
+                # Create applications table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS applications (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name TEXT UNIQUE NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Create capabilities table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS capabilities (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        application_id INTEGER NOT NULL,
+                        capability TEXT NOT NULL,
+                        FOREIGN KEY (application_id) REFERENCES applications(id) ON DELETE CASCADE,
+                        UNIQUE(application_id, capability)
+                    )
+                ''')
+                
+                # Create user_consents table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS user_consents (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id TEXT NOT NULL,
+                        requesting_app_id INTEGER NOT NULL,
+                        destination_app_id INTEGER NOT NULL,
+                        capability TEXT NOT NULL,
+                        granted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (requesting_app_id) REFERENCES applications(id) ON DELETE CASCADE,
+                        FOREIGN KEY (destination_app_id) REFERENCES applications(id) ON DELETE CASCADE,
+                        UNIQUE(user_id, requesting_app_id, destination_app_id, capability)
+                    )
+                ''')
+                
+                # Create indexes
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_consents_user_id ON user_consents(user_id)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_capabilities_app_id ON capabilities(application_id)')
+                
+            migrate(conn)
     
     def create_application(self, name: str) -> int:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('INSERT INTO applications (name) VALUES (?)', (name,))
-            return cursor.lastrowid
+            app_id = cursor.lastrowid
+            self._record_change(cursor, 'create_application', application_id=app_id)
+            return app_id
     
     def get_application(self, app_id: int) -> Optional[Dict[str, Any]]:
         with self._get_connection() as conn:
@@ -86,17 +99,43 @@ class SQLiteRepository(DatabaseRepository):
             row = cursor.fetchone()
             return dict(row) if row else None
     
-    def list_applications(self) -> List[Dict[str, Any]]:
+    def list_applications(self, limit: Optional[int] = None,
+                          after: Optional[str] = None) -> List[Dict[str, Any]]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM applications ORDER BY name')
+            cursor.execute(
+                'SELECT * FROM applications WHERE ? IS NULL OR name > ? ORDER BY name LIMIT ?',
+                (after, after, -1 if limit is None else limit)
+            )
             return [dict(row) for row in cursor.fetchall()]
     
+    def list_applications_with_capabilities(self, limit: Optional[int] = None,
+                                            after: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT a.id, a.name, a.created_at, c.capability
+                FROM (SELECT * FROM applications WHERE ? IS NULL OR name > ? ORDER BY name LIMIT ?) a
+                LEFT JOIN capabilities c ON c.application_id = a.id
+                ORDER BY a.name, c.capability
+            ''', (after, after, -1 if limit is None else limit))
+            apps: List[Dict[str, Any]] = []
+            for row in cursor.fetchall():
+                if not apps or apps[-1]['id'] != row['id']:
+                    apps.append({"id": row['id'], "name": row['name'], "created_at": row['created_at'],
+                                 "capabilities": []})
+                if row['capability'] is not None:
+                    apps[-1]['capabilities'].append(row['capability'])
+            return apps
+    
     def delete_application(self, app_id: int) -> bool:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM applications WHERE id = ?', (app_id,))
-            return cursor.rowcount > 0
+            if cursor.rowcount == 0:
+                return False
+            self._record_change(cursor, 'delete_application', application_id=app_id)
+            return True
     
     def add_capability(self, app_id: int, capability: str) -> bool:
         try:
@@ -106,6 +145,7 @@ class SQLiteRepository(DatabaseRepository):
                     'INSERT INTO capabilities (application_id, capability) VALUES (?, ?)',
                     (app_id, capability)
                 )
+                self._record_change(cursor, 'add_capability', application_id=app_id, capability=capability)
                 return True
         except sqlite3.IntegrityError:
             return False
@@ -117,7 +157,10 @@ class SQLiteRepository(DatabaseRepository):
                 'DELETE FROM capabilities WHERE application_id = ? AND capability = ?',
                 (app_id, capability)
             )
-            return cursor.rowcount > 0
+            if cursor.rowcount == 0:
+                return False
+            self._record_change(cursor, 'remove_capability', application_id=app_id, capability=capability)
+            return True
     
     def list_capabilities(self, app_id: int) -> List[str]:
         with self._get_connection() as conn:
@@ -128,19 +171,134 @@ class SQLiteRepository(DatabaseRepository):
             )
             return [row['capability'] for row in cursor.fetchall()]
     
+    # Capabilities are stored as capabilities.id; grants of capabilities the
+    # destination app does not have, or from a requesting app that no longer
+    # exists, select no row and are skipped instead of failing the foreign key.
+    GRANT_SQL = '''
+        INSERT OR IGNORE INTO user_consents
+        (user_id, requesting_app_id, destination_app_id, capability_id)
+        SELECT ?, ?, ?, id FROM capabilities WHERE application_id = ? AND capability = ?
+        AND EXISTS (SELECT 1 FROM applications WHERE id = ?)
+    '''
+    
     def grant_consent(self, user_id: str, requesting_app_id: int,
                      destination_app_id: int, capability: str) -> bool:
-        try:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                self.GRANT_SQL,
+                (user_id, requesting_app_id, destination_app_id, destination_app_id, capability,
+                 requesting_app_id)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._record_change(cursor, 'grant', user_id, requesting_app_id, destination_app_id,
+                                capability=capability)
+            return True
+    
+    def grant_consents_bulk(self, grants: Iterable[Tuple[str, int, int, str]]) -> int:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # Take the write lock first so every row above last_id is ours
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM user_consents')
+            last_id = cursor.fetchone()[0]
+            cursor.executemany(self.GRANT_SQL, (
+                (user_id, requesting_app_id, destination_app_id, destination_app_id, capability,
+                 requesting_app_id)
+                for user_id, requesting_app_id, destination_app_id, capability in grants
+            ))
+            granted = cursor.rowcount
+            if granted > 0:
                 cursor.execute('''
-                    INSERT INTO user_consents 
-                    (user_id, requesting_app_id, destination_app_id, capability)
-                    VALUES (?, ?, ?, ?)
-                ''', (user_id, requesting_app_id, destination_app_id, capability))
-                return True
-        except sqlite3.IntegrityError:
-            return False
+                    INSERT INTO consent_changes
+                    (kind, user_id, requesting_app_id, destination_app_id, capability)
+                    SELECT 'grant', uc.user_id, uc.requesting_app_id, uc.destination_app_id, c.capability
+                    FROM user_consents uc
+                    JOIN capabilities c ON c.id = uc.capability_id
+                    WHERE uc.id > ?
+                    ORDER BY uc.id
+                ''', (last_id,))
+            return granted
+    
+    def grant_consent_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                              capabilities: List[str]) -> Dict[str, Any]:
+        return self.grant_consents_by_name([(user_id, requesting_app_name, destination_app_name, capabilities)])[0]
+    
+    def grant_consents_by_name(self, grants: List[Tuple[str, str, str, List[str]]]) -> List[Dict[str, Any]]:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # Resolve, validate and insert under the write lock, so a concurrent delete cannot land in between
+            cursor.execute('BEGIN IMMEDIATE')
+            return [self._grant_by_name(cursor, *grant) for grant in grants]
+    
+    def _grant_by_name(self, cursor: sqlite3.Cursor, user_id: str, requesting_app_name: str,
+                       destination_app_name: str, capabilities: List[str]) -> Dict[str, Any]:
+        capabilities = list(dict.fromkeys(capabilities))
+        cursor.execute('SELECT id, name FROM applications WHERE name IN (?, ?)',
+                       (requesting_app_name, destination_app_name))
+        ids = {row['name']: row['id'] for row in cursor.fetchall()}
+        result = {
+            "requesting_app_id": ids.get(requesting_app_name),
+            "destination_app_id": ids.get(destination_app_name),
+            "newly_granted": [],
+            "already_granted": [],
+            "unknown": []
+        }
+        if result['requesting_app_id'] is None or result['destination_app_id'] is None:
+            return result
+        key = (user_id, result['requesting_app_id'], result['destination_app_id'])
+
+        placeholders = ','.join(['?' for _ in capabilities])
+        cursor.execute(f'''
+            SELECT c.id, c.capability, uc.id IS NOT NULL AS granted
+            FROM capabilities c
+            LEFT JOIN user_consents uc
+            ON uc.user_id = ? AND uc.requesting_app_id = ? AND uc.destination_app_id = ?
+            AND uc.capability_id = c.id
+            WHERE c.application_id = ? AND c.capability IN ({placeholders})
+        ''', key + (key[2],) + tuple(capabilities))
+        known = {row['capability']: (row['id'], row['granted']) for row in cursor.fetchall()}
+        result['unknown'] = [cap for cap in capabilities if cap not in known]
+        if result['unknown']:
+            return result
+
+        for cap in capabilities:
+            result['already_granted' if known[cap][1] else 'newly_granted'].append(cap)
+        cursor.executemany(
+            'INSERT INTO user_consents (user_id, requesting_app_id, destination_app_id, capability_id) '
+            'VALUES (?, ?, ?, ?)',
+            [key + (known[cap][0],) for cap in result['newly_granted']]
+        )
+        cursor.executemany(self.CHANGE_SQL, [
+            ('grant',) + key + (None, cap) for cap in result['newly_granted']
+        ])
+        return result
+    
+    def apply_consent_writes(self, writes: List[Tuple[str, str, int, int, str]]) -> List[bool]:
+        results = []
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            for kind, user_id, requesting_app_id, destination_app_id, capability in writes:
+                if kind == 'grant':
+                    cursor.execute(
+                        self.GRANT_SQL,
+                        (user_id, requesting_app_id, destination_app_id, destination_app_id, capability,
+                         requesting_app_id)
+                    )
+                elif kind == 'revoke':
+                    cursor.execute(
+                        self.REVOKE_SQL,
+                        (user_id, requesting_app_id, destination_app_id, destination_app_id, capability)
+                    )
+                else:
+                    raise ValueError(f"Unknown consent write '{kind}'")
+                changed = cursor.rowcount > 0
+                if changed:
+                    self._record_change(cursor, kind, user_id, requesting_app_id, destination_app_id,
+                                        capability=capability)
+                results.append(changed)
+        return results
     
     def check_consent(self, user_id: str, requesting_app_id: int,
                      destination_app_id: int, capabilities: List[str]) -> Dict[str, bool]:
@@ -148,49 +306,290 @@ class SQLiteRepository(DatabaseRepository):
             cursor = conn.cursor()
             placeholders = ','.join(['?' for _ in capabilities])
             cursor.execute(f'''
-                SELECT capability FROM user_consents
-                WHERE user_id = ? AND requesting_app_id = ? 
-                AND destination_app_id = ? AND capability IN ({placeholders})
-            ''', [user_id, requesting_app_id, destination_app_id] + capabilities)
+                SELECT c.capability FROM capabilities c
+                JOIN user_consents uc ON uc.capability_id = c.id
+                WHERE c.application_id = ? AND c.capability IN ({placeholders})
+                AND uc.user_id = ? AND uc.requesting_app_id = ? AND uc.destination_app_id = ?
+            ''', [destination_app_id] + capabilities + [user_id, requesting_app_id, destination_app_id])
             
             granted = {row['capability'] for row in cursor.fetchall()}
             return {cap: cap in granted for cap in capabilities}
     
+    def check_consent_batch(self, checks: List[Tuple[str, int, int, List[str]]]) -> List[Dict[str, bool]]:
+        results = [{cap: False for cap in capabilities} for _, _, _, capabilities in checks]
+        rows = [
+            (item, user_id, requesting_app_id, destination_app_id, cap)
+            for item, (user_id, requesting_app_id, destination_app_id, capabilities) in enumerate(checks)
+            for cap in capabilities
+        ]
+        if not rows:
+            return results
+        
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # Stage the batch in a connection-local temp table and answer it with one join
+            cursor.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS consent_check_batch (
+                    item INTEGER NOT NULL,
+                    user_id TEXT NOT NULL,
+                    requesting_app_id INTEGER NOT NULL,
+                    destination_app_id INTEGER NOT NULL,
+                    capability TEXT NOT NULL
+                )
+            ''')
+            try:
+                cursor.executemany('''
+                    INSERT INTO consent_check_batch
+                    (item, user_id, requesting_app_id, destination_app_id, capability)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', rows)
+                cursor.execute('''
+                    SELECT b.item, b.capability FROM consent_check_batch b
+                    JOIN capabilities c
+                    ON c.application_id = b.destination_app_id AND c.capability = b.capability
+                    JOIN user_consents uc
+                    ON uc.user_id = b.user_id AND uc.requesting_app_id = b.requesting_app_id
+                    AND uc.destination_app_id = b.destination_app_id AND uc.capability_id = c.id
+                ''')
+                for row in cursor.fetchall():
+                    results[row['item']][row['capability']] = True
+            finally:
+                cursor.execute('DELETE FROM consent_check_batch')
+        return results
+    
+    def list_granted_capabilities(self, user_id: str, requesting_app_id: int,
+                                  destination_app_id: int) -> Set[str]:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.capability FROM user_consents uc
+                JOIN capabilities c ON c.id = uc.capability_id
+                WHERE uc.user_id = ? AND uc.requesting_app_id = ? AND uc.destination_app_id = ?
+            ''', (user_id, requesting_app_id, destination_app_id))
+            return {row['capability'] for row in cursor.fetchall()}
+    
+    REVOKE_SQL = '''
+        DELETE FROM user_consents
+        WHERE user_id = ? AND requesting_app_id = ? AND destination_app_id = ?
+        AND capability_id = (
+            SELECT id FROM capabilities WHERE application_id = ? AND capability = ?
+        )
+    '''
+    
     def revoke_consent(self, user_id: str, requesting_app_id: int,
                       destination_app_id: int, capability: str) -> bool:
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                DELETE FROM user_consents
-                WHERE user_id = ? AND requesting_app_id = ?
-                AND destination_app_id = ? AND capability = ?
-            ''', (user_id, requesting_app_id, destination_app_id, capability))
-            return cursor.rowcount > 0
+            cursor.execute(
+                self.REVOKE_SQL,
+                (user_id, requesting_app_id, destination_app_id, destination_app_id, capability)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._record_change(cursor, 'revoke', user_id, requesting_app_id, destination_app_id,
+                                capability=capability)
+            return True
     
     def revoke_all_user_consent(self, user_id: str) -> int:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM user_consents WHERE user_id = ?', (user_id,))
-            return cursor.rowcount
+            count = cursor.rowcount
+            # Recorded even when nothing is left, since a chunked job may have deleted the rows already
+            self._record_change(cursor, 'revoke_user', user_id)
+            return count
     
     def revoke_all_consent(self) -> int:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM user_consents')
+            count = cursor.rowcount
+            self._record_change(cursor, 'revoke_all')
+            return count
+    
+    def delete_consents_chunk(self, user_id: Optional[str] = None, app_id: Optional[int] = None,
+                              limit: int = 1000) -> int:
+        # Separate statements per filter so each can use its index
+        if user_id is not None:
+            where, params = 'user_id = ?', (user_id,)
+        elif app_id is not None:
+            where, params = 'requesting_app_id = ? OR destination_app_id = ?', (app_id, app_id)
+        else:
+            where, params = '1', ()
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f'DELETE FROM user_consents WHERE id IN (SELECT id FROM user_consents WHERE {where} LIMIT ?)',
+                params + (limit,)
+            )
             return cursor.rowcount
     
-    def list_user_consents(self, user_id: str) -> List[Dict[str, Any]]:
+    def list_user_consents(self, user_id: str, limit: Optional[int] = None,
+                           after: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        after_granted_at, after_id = after if after else (None, None)
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT 
-                    uc.*,
+                    uc.id,
+                    uc.user_id,
+                    uc.requesting_app_id,
+                    uc.destination_app_id,
+                    c.capability,
+                    uc.granted_at,
                     ra.name as requesting_app_name,
                     da.name as destination_app_name
                 FROM user_consents uc
+                JOIN capabilities c ON uc.capability_id = c.id
                 JOIN applications ra ON uc.requesting_app_id = ra.id
                 JOIN applications da ON uc.destination_app_id = da.id
                 WHERE uc.user_id = ?
-                ORDER BY uc.granted_at DESC
-            ''', (user_id,))
-            return [dict(row) for row in cursor.fetchall()]
\ No newline at end of file
+                AND (? IS NULL OR (uc.granted_at, uc.id) < (?, ?))
+                ORDER BY uc.granted_at DESC, uc.id DESC
+                LIMIT ?
+            ''', (user_id, after_granted_at, after_granted_at, after_id, -1 if limit is None else limit))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    # Change feed: rows are written in the same transaction as the change they describe
+    CHANGE_SQL = '''
+        INSERT INTO consent_changes
+        (kind, user_id, requesting_app_id, destination_app_id, application_id, capability)
+        VALUES (?, ?, ?, ?, ?, ?)
+    '''
+    
+    def _record_change(self, cursor: sqlite3.Cursor, kind: str, user_id: Optional[str] = None,
+                       requesting_app_id: Optional[int] = None, destination_app_id: Optional[int] = None,
+                       application_id: Optional[int] = None, capability: Optional[str] = None):
+        cursor.execute(self.CHANGE_SQL, (kind, user_id, requesting_app_id, destination_app_id,
+                                         application_id, capability))
+    
+    def record_changes(self, changes: Iterable[Tuple[str, Optional[str], Optional[int], Optional[int],
+                                                     Optional[int], Optional[str]]]):
+        """Append change rows for writes made elsewhere (e.g. in shard files)"""
+        with self._get_connection() as conn:
+            conn.executemany(self.CHANGE_SQL, changes)
+    
+    def list_changes(self, since: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT * FROM consent_changes WHERE seq > ? ORDER BY seq LIMIT ?',
+                (since, limit)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def last_change_seq(self) -> int:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM consent_changes')
+            return cursor.fetchone()[0]
+    
+    def snapshot(self):
+        """Open a dedicated connection reading from one consistent state of the store"""
+        return self._connections.snapshot()
+    
+    @staticmethod
+    def export_catalog(conn: sqlite3.Connection) -> Iterator[Dict[str, Any]]:
+        """Yield application and capability records, skipping rows orphaned by application deletes"""
+        for row in conn.execute('SELECT id, name, created_at FROM applications ORDER BY id'):
+            yield {"type": "application", "id": row[0], "name": row[1], "created_at": row[2]}
+        for row in conn.execute('''
+            SELECT c.application_id, c.capability FROM capabilities c
+            JOIN applications a ON a.id = c.application_id
+            ORDER BY c.application_id, c.capability
+        '''):
+            yield {"type": "capability", "application_id": row[0], "capability": row[1]}
+    
+    def export_records(self) -> Iterator[Dict[str, Any]]:
+        with self.snapshot() as conn:
+            yield from self.export_catalog(conn)
+            # Rows are fetched lazily, so the table is never held in memory
+            for row in conn.execute('''
+                SELECT uc.user_id, uc.requesting_app_id, uc.destination_app_id, c.capability, uc.granted_at
+                FROM user_consents uc
+                JOIN capabilities c ON uc.capability_id = c.id
+                JOIN applications ra ON uc.requesting_app_id = ra.id
+                JOIN applications da ON uc.destination_app_id = da.id
+                ORDER BY uc.id
+            '''):
+                yield {
+                    "type": "consent",
+                    "user_id": row[0],
+                    "requesting_app_id": row[1],
+                    "destination_app_id": row[2],
+                    "capability": row[3],
+                    "granted_at": row[4]
+                }
+    
+    # Secondary indexes dropped while restoring and rebuilt once at the end
+    RESTORE_INDEXES = {
+        'idx_capabilities_app_id': 'CREATE INDEX IF NOT EXISTS idx_capabilities_app_id ON capabilities(application_id)',
+        'idx_user_consents_user_granted':
+            'CREATE INDEX IF NOT EXISTS idx_user_consents_user_granted ON user_consents(user_id, granted_at)',
+        'idx_user_consents_requesting':
+            'CREATE INDEX IF NOT EXISTS idx_user_consents_requesting ON user_consents(requesting_app_id)',
+        'idx_user_consents_destination':
+            'CREATE INDEX IF NOT EXISTS idx_user_consents_destination ON user_consents(destination_app_id)',
+        'idx_user_consents_capability':
+            'CREATE INDEX IF NOT EXISTS idx_user_consents_capability ON user_consents(capability_id)',
+    }
+    
+    def begin_restore(self):
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            for index in self.RESTORE_INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS {index}')
+            cursor.execute('DELETE FROM user_consents')
+            cursor.execute('DELETE FROM capabilities')
+            cursor.execute('DELETE FROM applications')
+    
+    def restore_records(self, records: List[Dict[str, Any]]) -> int:
+        applications = [(r['id'], r['name'], r.get('created_at')) for r in records if r['type'] == 'application']
+        capabilities = [(r['application_id'], r['capability'], r['application_id'])
+                        for r in records if r['type'] == 'capability']
+        consents = [
+            (r['user_id'], r['requesting_app_id'], r['destination_app_id'], r.get('granted_at'),
+             r['destination_app_id'], r['capability'], r['requesting_app_id'])
+            for r in records if r['type'] == 'consent'
+        ]
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            loaded = 0
+            cursor.executemany('''
+                INSERT OR IGNORE INTO applications (id, name, created_at)
+                VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ''', applications)
+            loaded += cursor.rowcount
+            # Records referencing unknown applications are skipped rather than failing a foreign key
+            cursor.executemany('''
+                INSERT OR IGNORE INTO capabilities (application_id, capability)
+                SELECT ?, ? WHERE EXISTS (SELECT 1 FROM applications WHERE id = ?)
+            ''', capabilities)
+            loaded += cursor.rowcount
+            # Consents name their capability, so resolve it through the unique (application_id, capability) index
+            cursor.executemany('''
+                INSERT OR IGNORE INTO user_consents
+                (user_id, requesting_app_id, destination_app_id, capability_id, granted_at)
+                SELECT ?, ?, ?, id, COALESCE(?, CURRENT_TIMESTAMP)
+                FROM capabilities WHERE application_id = ? AND capability = ?
+                AND EXISTS (SELECT 1 FROM applications WHERE id = ?)
+            ''', consents)
+            loaded += cursor.rowcount
+            return loaded
+    
+    def finish_restore(self):
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            for create in self.RESTORE_INDEXES.values():
+                cursor.execute(create)
+            cursor.execute('ANALYZE')
+            # Consumers cannot replay a restore, so tell them to drop everything they cached
+            self._record_change(cursor, 'restore')
+    
+    def warm_up(self) -> int:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # Scanning a covering index reads all of its pages; COUNT(*) would scan the smallest index instead
+            cursor.execute('SELECT COUNT(capability) FROM capabilities INDEXED BY sqlite_autoindex_capabilities_1')
+            cursor.execute('SELECT COUNT(capability_id) FROM user_consents INDEXED BY sqlite_autoindex_user_consents_1')
+            return cursor.fetchone()[0]
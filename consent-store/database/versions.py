@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+from database.repository import DatabaseRepository
+from database.forwarding_repository import ForwardingRepository
+
+# Change feed kinds by the listings they can alter; unknown kinds are treated as altering everything
+USER_CHANGES = frozenset(('grant', 'revoke', 'revoke_user'))
+STORE_CHANGES = frozenset(('revoke_all', 'delete_application', 'remove_capability', 'restore'))
+CATALOG_CHANGES = frozenset(('create_application', 'add_capability', 'delete_application',
+                             'remove_capability', 'restore'))
+
+def listings_altered(kind: str) -> Tuple[bool, bool]:
+    """Whether a change of this kind alters every user's listing and the catalog listing"""
+    if kind in USER_CHANGES:
+        return False, False
+    known = kind in STORE_CHANGES or kind in CATALOG_CHANGES
+    return not known or kind in STORE_CHANGES, not known or kind in CATALOG_CHANGES
+
+class VersionTracker:
+    """Per-user and catalog version counters, bumped after every write commits.
+
+    A user's consent listing can change through the user's own writes or
+    through store-wide ones (revoke all, application or capability removal,
+    restore), so its version is the pair (store, user). The boot id makes
+    versions from an earlier process, or another worker, never compare equal.
+    """
+
+    def __init__(self):
+        self.boot_id = os.urandom(4).hex()
+        self._lock = threading.Lock()
+        self._store = 0
+        self._catalog = 0
+        self._users: Dict[str, int] = {}
+
+    def user_version(self, user_id: str) -> str:
+        return f"{self._store}.{self._users.get(user_id, 0)}"
+
+    def catalog_version(self) -> str:
+        return str(self._catalog)
+
+    def bump_users(self, user_ids: Iterable[str]):
+        with self._lock:
+            for user_id in user_ids:
+                self._users[user_id] = self._users.get(user_id, 0) + 1
+
+    def bump_store(self):
+        with self._lock:
+            self._store += 1
+
+    def bump_catalog(self):
+        with self._lock:
+            self._catalog += 1
+
+    def cached_user_version(self, user_id: str) -> Optional[str]:
+        """Return user_version if it can be answered without a query, else None"""
+        return self.user_version(user_id)
+
+    def changes_applied(self, changes: List[Dict[str, Any]]):
+        """Account for change feed entries committed by another process"""
+        users = {change['user_id'] for change in changes if change['kind'] in USER_CHANGES}
+        altered = [listings_altered(change['kind']) for change in changes]
+        if users:
+            self.bump_users(users)
+        if any(store for store, _ in altered):
+            self.bump_store()
+        if any(catalog for _, catalog in altered):
+            self.bump_catalog()
+
+class SharedVersionTracker(VersionTracker):
+    """Versions taken from the change feed, so every process sharing the database agrees on them.
+
+    A version is the seq of the last change that could alter the listing, and
+    the boot id is the store id kept in the database, so ETags match across
+    workers and change if the file is recreated. Local writes bump nothing:
+    they reach changes_applied through the coherence poll like everyone
+    else's. A user seen for the first time is looked up in the change feed.
+    """
+
+    def __init__(self, db_path: str):
+        super().__init__()
+        # Autocommit, so no read transaction stays open between lookups
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.boot_id = self._conn.execute("SELECT value FROM store_meta WHERE name = 'store_id'").fetchone()[0]
+        self._store = self._last_seq(STORE_CHANGES)
+        self._catalog = self._last_seq(CATALOG_CHANGES)
+
+    def _last_seq(self, kinds: Iterable[str]) -> int:
+        kinds = sorted(kinds)
+        # Every store-wide and catalog change has no user, so idx_consent_changes_user narrows this
+        return self._conn.execute(
+            f'SELECT COALESCE(MAX(seq), 0) FROM consent_changes '
+            f'WHERE user_id IS NULL AND kind IN ({", ".join("?" * len(kinds))})',
+            kinds
+        ).fetchone()[0]
+
+    def user_version(self, user_id: str) -> str:
+        user_seq = self._users.get(user_id)
+        if user_seq is None:
+            with self._lock:
+                seq = self._conn.execute(
+                    'SELECT COALESCE(MAX(seq), 0) FROM consent_changes WHERE user_id = ?', (user_id,)
+                ).fetchone()[0]
+                user_seq = self._users[user_id] = max(self._users.get(user_id, 0), seq)
+        return f"{self._store}.{user_seq}"
+
+    def cached_user_version(self, user_id: str) -> Optional[str]:
+        user_seq = self._users.get(user_id)
+        return None if user_seq is None else f"{self._store}.{user_seq}"
+
+    def bump_users(self, user_ids: Iterable[str]):
+        pass
+
+    def bump_store(self):
+        pass
+
+    def bump_catalog(self):
+        pass
+
+    def changes_applied(self, changes: List[Dict[str, Any]]):
+        with self._lock:
+            for change in changes:
+                seq = change['seq']
+                if change['kind'] in USER_CHANGES:
+                    # Users never looked up are read from the feed when first asked for
+                    if change['user_id'] in self._users:
+                        self._users[change['user_id']] = max(self._users[change['user_id']], seq)
+                    continue
+                store, catalog = listings_altered(change['kind'])
+                if store:
+                    self._store = max(self._store, seq)
+                if catalog:
+                    self._catalog = max(self._catalog, seq)
+
+    def close(self):
+        self._conn.close()
+
+class VersionedRepository(ForwardingRepository):
+    """Bumps a VersionTracker after every operation that can change a listing"""
+
+    def __init__(self, inner: DatabaseRepository, versions: VersionTracker):
+        super().__init__(inner)
+        self.versions = versions
+
+    def create_application(self, name: str) -> int:
+        try:
+            return self.inner.create_application(name)
+        finally:
+            self.versions.bump_catalog()
+
+    def delete_application(self, app_id: int) -> bool:
+        try:
+            return self.inner.delete_application(app_id)
+        finally:
+            self.versions.bump_catalog()
+            self.versions.bump_store()
+
+    def add_capability(self, app_id: int, capability: str) -> bool:
+        try:
+            return self.inner.add_capability(app_id, capability)
+        finally:
+            self.versions.bump_catalog()
+
+    def remove_capability(self, app_id: int, capability: str) -> bool:
+        try:
+            return self.inner.remove_capability(app_id, capability)
+        finally:
+            self.versions.bump_catalog()
+            self.versions.bump_store()
+
+    def grant_consent(self, user_id: str, requesting_app_id: int,
+                     destination_app_id: int, capability: str) -> bool:
+        try:
+            return self.inner.grant_consent(user_id, requesting_app_id, destination_app_id, capability)
+        finally:
+            self.versions.bump_users([user_id])
+
+    def grant_consents_bulk(self, grants: Iterable[Tuple[str, int, int, str]]) -> int:
+        grants = list(grants)
+        try:
+            return self.inner.grant_consents_bulk(grants)
+        finally:
+            self.versions.bump_users({grant[0] for grant in grants})
+
+    def grant_consent_by_name(self, user_id: str, requesting_app_name: str, destination_app_name: str,
+                              capabilities: List[str]) -> Dict[str, Any]:
+        try:
+            return self.inner.grant_consent_by_name(user_id, requesting_app_name, destination_app_name,
+                                                    capabilities)
+        finally:
+            self.versions.bump_users([user_id])
+
+    def grant_consents_by_name(self, grants: List[Tuple[str, str, str, List[str]]]) -> List[Dict[str, Any]]:
+        grants = list(grants)
+        try:
+            return self.inner.grant_consents_by_name(grants)
+        finally:
+            self.versions.bump_users({grant[0] for grant in grants})
+
+    def apply_consent_writes(self, writes: List[Tuple[str, str, int, int, str]]) -> List[bool]:
+        try:
+            return self.inner.apply_consent_writes(writes)
+        finally:
+            self.versions.bump_users({write[1] for write in writes})
+
+    def revoke_consent(self, user_id: str, requesting_app_id: int,
+                      destination_app_id: int, capability: str) -> bool:
+        try:
+            return self.inner.revoke_consent(user_id, requesting_app_id, destination_app_id, capability)
+        finally:
+            self.versions.bump_users([user_id])
+
+    def revoke_all_user_consent(self, user_id: str) -> int:
+        try:
+            return self.inner.revoke_all_user_consent(user_id)
+        finally:
+            self.versions.bump_users([user_id])
+
+    def revoke_all_consent(self) -> int:
+        try:
+            return self.inner.revoke_all_consent()
+        finally:
+            self.versions.bump_store()
+
+    def delete_consents_chunk(self, user_id: Optional[str] = None, app_id: Optional[int] = None,
+                              limit: int = 1000) -> int:
+        try:
+            return self.inner.delete_consents_chunk(user_id, app_id, limit)
+        finally:
+            if user_id is not None:
+                self.versions.bump_users([user_id])
+            else:
+                self.versions.bump_store()
+
+    def restore_records(self, records: List[Dict[str, Any]]) -> int:
+        try:
+            return self.inner.restore_records(records)
+        finally:
+            self.versions.bump_catalog()
+            self.versions.bump_store()
+
+    def begin_restore(self):
+        try:
+            return self.inner.begin_restore()
+        finally:
+            self.versions.bump_catalog()
+            self.versions.bump_store()
+
+    def finish_restore(self):
+        try:
+            return self.inner.finish_restore()
+        finally:
+            self.versions.bump_catalog()
+            self.versions.bump_store()
@@ -0,0 +1,24 @@
+from typing import Callable, Optional
+from database.async_repository import AsyncDatabaseRepository
+from database.coherence import CoherenceMonitor
+
+class CoherenceMiddleware:
+    """Pure ASGI middleware that applies other workers' committed writes before each request.
+
+    monitor returns the CoherenceMonitor, or None until the repository has been
+    opened; it is looked up per request so this never opens the database itself.
+    The poll runs on the database executor, never on the event loop.
+    """
+
+    def __init__(self, app, monitor: Callable[[], Optional[CoherenceMonitor]],
+                 repository: Callable[[], AsyncDatabaseRepository]):
+        self.app = app
+        self.monitor = monitor
+        self.repository = repository
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            monitor = self.monitor()
+            if monitor is not None:
+                await self.repository().run(monitor.poll)
+        await self.app(scope, receive, send)
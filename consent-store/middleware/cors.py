@@ -0,0 +1,44 @@
+from typing import Iterable, List, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+Header = Tuple[bytes, bytes]
+
+class CORSMiddleware:
+    """Pure ASGI middleware that allows every origin.
+
+    Header tuples are built once. Preflight (OPTIONS) requests are answered
+    here without reaching the router, and every other HTTP response gets the
+    CORS headers appended to its start message. Unlike @app.middleware("http")
+    there is no extra task or response stream wrapper per request.
+    """
+
+    def __init__(self, app: ASGIApp, allow_methods: Iterable[str] = ("GET", "POST", "PUT", "DELETE", "OPTIONS"),
+                 expose_headers: Iterable[str] = (), max_age: int = 3600):
+        self.app = app
+        self.headers: List[Header] = [
+            (b"access-control-allow-origin", b"*"),
+            (b"access-control-allow-methods", ", ".join(allow_methods).encode("latin-1")),
+            (b"access-control-allow-headers", b"*"),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+        ]
+        expose_headers = list(expose_headers)
+        if expose_headers:
+            self.headers.append((b"access-control-expose-headers", ", ".join(expose_headers).encode("latin-1")))
+        self.preflight_headers: List[Header] = self.headers + [(b"content-length", b"0")]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS":
+            await send({"type": "http.response.start", "status": 200, "headers": self.preflight_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + self.headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Union, Literal, Annotated
 from datetime import datetime
 
 # Application schemas
@@ -28,6 +28,13 @@ class ConsentGrant(BaseModel):
     destination_app_name: str
     capabilities: List[str]
 
+class ConsentImportResponse(BaseModel):
+    lines: int
+    granted: int
+    duplicates: int
+    rejected: int
+    errors: List[str]
+
 class ConsentCheck(BaseModel):
     user_id: str
     requesting_app_name: str
@@ -38,6 +45,17 @@ class ConsentCheckResponse(BaseModel):
     granted: Dict[str, bool]
     all_granted: bool
 
+class ConsentCheckBatch(BaseModel):
+    items: List[ConsentCheck]
+
+class ConsentCheckBatchResult(BaseModel):
+    granted: Dict[str, bool]
+    all_granted: bool
+    error: Optional[str] = None
+
+class ConsentCheckBatchResponse(BaseModel):
+    results: List[ConsentCheckBatchResult]
+
 class ConsentRevoke(BaseModel):
     user_id: str
     requesting_app_name: str
@@ -54,9 +72,99 @@ class UserConsent(BaseModel):
     capability: str
     granted_at: datetime
 
+class ConsentChange(BaseModel):
+    seq: int
+    kind: str
+    user_id: Optional[str] = None
+    requesting_app_id: Optional[int] = None
+    destination_app_id: Optional[int] = None
+    application_id: Optional[int] = None
+    capability: Optional[str] = None
+    changed_at: datetime
+
+class ConsentChangesResponse(BaseModel):
+    changes: List[ConsentChange]
+    last_seq: int
+
+class ConsentCacheStats(BaseModel):
+    enabled: bool
+    size: int = 0
+    max_size: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+class SqlStatementStats(BaseModel):
+    shape: str
+    count: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    plan: List[str]
+
+class SlowSqlStatement(BaseModel):
+    shape: str
+    ms: float
+    plan: List[str]
+    at: datetime
+
+class SqlProfileStats(BaseModel):
+    enabled: bool
+    slow_ms: Optional[float] = None
+    statements: List[SqlStatementStats] = []
+    slow: List[SlowSqlStatement] = []
+
+# Snapshot schemas (one NDJSON line each in /admin/export and /admin/restore)
+class SnapshotApplication(BaseModel):
+    type: Literal["application"]
+    id: int
+    name: str
+    created_at: Optional[str] = None
+
+class SnapshotCapability(BaseModel):
+    type: Literal["capability"]
+    application_id: int
+    capability: str
+
+class SnapshotConsent(BaseModel):
+    type: Literal["consent"]
+    user_id: str
+    requesting_app_id: int
+    destination_app_id: int
+    capability: str
+    granted_at: Optional[str] = None
+
+SnapshotRecord = Annotated[
+    Union[SnapshotApplication, SnapshotCapability, SnapshotConsent],
+    Field(discriminator="type")
+]
+
+class RestoreResponse(BaseModel):
+    lines: int
+    restored: int
+    rejected: int
+    errors: List[str]
+
+class JobStatus(BaseModel):
+    id: int
+    kind: str
+    status: str
+    user_id: Optional[str] = None
+    application_id: Optional[int] = None
+    deleted: int
+    chunks: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 # Response models
 class MessageResponse(BaseModel):
     message: str
 
+class ConsentGrantResponse(MessageResponse):
+    newly_granted: List[str] = []
+    already_granted: List[str] = []
+
 class CountResponse(BaseModel):
     count: int
\ No newline at end of file
@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import json
+import zlib
+from tempfile import SpooledTemporaryFile
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.responses import StreamingResponse, JSONResponse
+from pydantic import TypeAdapter, ValidationError
+from typing import List, Dict, Any, AsyncIterator
+from models.schemas import SnapshotRecord, RestoreResponse, JobStatus, SqlProfileStats, MessageResponse
+from database.async_repository import AsyncDatabaseRepository
+from database.jobs import Job
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+EXPORT_BATCH_SIZE = 1000
+RESTORE_MAX_ERRORS = 100
+# Validated restore records are staged in memory up to this size, then on disk
+RESTORE_SPOOL_SIZE = 64 * 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+
+snapshot_record = TypeAdapter(SnapshotRecord)
+# Restores replace the whole store, so only one may run at a time
+restore_lock = asyncio.Lock()
+
+async def get_repository() -> AsyncDatabaseRepository:
+    import consent_store
+    return await consent_store.open_repository()
+
+def job_accepted(job: Job) -> JSONResponse:
+    """202 response for a job left running in the background"""
+    return JSONResponse(
+        status_code=202,
+        content=JobStatus(**job.to_dict()).model_dump(mode="json"),
+        headers={"Location": f"/admin/jobs/{job.id}"}
+    )
+
+async def wait_for_job(job: Job):
+    """Wait for a job to finish, raising 500 if it failed"""
+    await job.wait()
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Job {job.id} failed: {job.error}")
+
+@router.get("/jobs", response_model=List[JobStatus])
+async def list_jobs():
+    """List running and recently finished background jobs"""
+    import consent_store
+    return [JobStatus(**job.to_dict()) for job in consent_store.get_job_manager().list()]
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: int):
+    """Report the status and progress of a background job"""
+    import consent_store
+    job = consent_store.get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatus(**job.to_dict())
+
+@router.get("/sql/stats", response_model=SqlProfileStats)
+async def sql_stats():
+    """Report per-statement-shape SQLite timings, query plans and recent slow statements"""
+    import consent_store
+    profiler = consent_store.get_sql_profiler()
+    if profiler is None:
+        return SqlProfileStats(enabled=False)
+    return SqlProfileStats(enabled=True, **profiler.snapshot())
+
+@router.delete("/sql/stats", response_model=MessageResponse)
+async def reset_sql_stats():
+    """Clear the SQL profiling aggregates and slow statement log"""
+    import consent_store
+    profiler = consent_store.get_sql_profiler()
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="SQL profiling is disabled")
+    profiler.reset()
+    return MessageResponse(message="SQL statistics reset")
+
+@router.get("/export")
+async def export_snapshot(db: AsyncDatabaseRepository = Depends(get_repository)):
+    """Stream every application, capability and consent as gzip-compressed NDJSON"""
+    async def body():
+        # wbits=31 writes a gzip container, so the stream can be read with gunzip
+        compressor = zlib.compressobj(wbits=31)
+        async for batch in db.export_batches(EXPORT_BATCH_SIZE):
+            lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in batch)
+            data = compressor.compress(lines.encode())
+            if data:
+                yield data
+        yield compressor.flush()
+
+    return StreamingResponse(
+        body(),
+        media_type="application/gzip",
+        headers={"Content-Disposition": 'attachment; filename="consent_store.ndjson.gz"'}
+    )
+
+async def decompressed(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Pass a request body through, gunzipping it on the fly if it starts with the gzip magic"""
+    decompressor = None
+    async for data in stream:
+        if not data:
+            continue
+        if decompressor is None:
+            decompressor = zlib.decompressobj(wbits=31) if data.startswith(GZIP_MAGIC) else False
+        yield decompressor.decompress(data) if decompressor else data
+    if decompressor:
+        yield decompressor.flush()
+        if not decompressor.eof:
+            raise zlib.error("incomplete or truncated stream")
+
+@router.post("/restore", response_model=RestoreResponse)
+async def restore_snapshot(request: Request, chunk_size: int = Query(50000, ge=1, le=1000000),
+                           db: AsyncDatabaseRepository = Depends(get_repository)):
+    """Replace the whole store with an /admin/export stream (gzip or plain NDJSON).
+
+    The upload is read and validated into a staging file first, so a bad or
+    truncated body leaves the current data alone. Records are then loaded in
+    transactions of chunk_size with secondary indexes dropped, and the indexes
+    are rebuilt once at the end.
+    """
+    if restore_lock.locked():
+        raise HTTPException(status_code=409, detail="A restore is already in progress")
+
+    async with restore_lock:
+        with SpooledTemporaryFile(max_size=RESTORE_SPOOL_SIZE) as staged:
+            lines = 0
+            restored = 0
+            rejected = 0
+            errors: List[str] = []
+            pending: List[bytes] = []
+
+            def handle_line(line: bytes):
+                nonlocal lines, rejected
+                if not line.strip():
+                    return
+                lines += 1
+                try:
+                    record = snapshot_record.validate_json(line).model_dump()
+                except ValidationError as e:
+                    rejected += 1
+                    if len(errors) < RESTORE_MAX_ERRORS:
+                        errors.append(f"line {lines}: invalid record: {e.errors()[0]['msg']}")
+                    return
+                pending.append(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+
+            async def stage():
+                chunk = pending[:]
+                pending.clear()
+                await asyncio.to_thread(staged.writelines, chunk)
+
+            def read_chunk() -> List[Dict[str, Any]]:
+                return [json.loads(line) for line in itertools.islice(staged, chunk_size)]
+
+            try:
+                buffer = b""
+                async for data in decompressed(request.stream()):
+                    buffer += data
+                    *complete, buffer = buffer.split(b"\n")
+                    for line in complete:
+                        handle_line(line)
+                        if len(pending) >= chunk_size:
+                            await stage()
+                handle_line(buffer)
+                await stage()
+            except zlib.error as e:
+                raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+            staged.seek(0)
+
+            await db.begin_restore()
+            try:
+                while chunk := await asyncio.to_thread(read_chunk):
+                    restored += await db.restore_records(chunk)
+            finally:
+                await db.finish_restore()
+                import consent_store
+                await db.run(consent_store.get_catalog().refresh)
+
+            return RestoreResponse(lines=lines, restored=restored, rejected=rejected, errors=errors)
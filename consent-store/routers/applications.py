@@ -1,95 +1,170 @@
-from fastapi import APIRouter, HTTPException, Depends, Response
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Response, Request, Query
+from typing import List, Literal, Optional, Union
 from models.schemas import (
     ApplicationCreate, ApplicationResponse, ApplicationWithCapabilities,
-    CapabilityAdd, MessageResponse
+    CapabilityAdd, MessageResponse, JobStatus
 )
-from database.repository import DatabaseRepository
+from database.async_repository import AsyncDatabaseRepository
+from database.catalog import ApplicationCatalog
+from database.jobs import delete_in_chunks
+from routers.admin import job_accepted, wait_for_job
+from routers.pagination import (
+    NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, wants_ndjson, ndjson_response
+)
+from routers.fast_json import rows_response, ndjson_line
+from routers.conditional import make_etag, is_not_modified, not_modified_response, set_etag
 
 router = APIRouter(prefix="/applications", tags=["applications"])
 
-# Add OPTIONS handler for all applications routes
-@router.options("/{path:path}")
-async def applications_options_handler(path: str):
-    """Handle preflight OPTIONS requests for applications routes"""
-    return Response(
-        status_code=200,
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-            "Access-Control-Max-Age": "3600",
-        }
-    )
-
-def get_repository() -> DatabaseRepository:
+async def get_repository() -> AsyncDatabaseRepository:
+    import consent_store
+    return await consent_store.open_repository()
+
+async def get_catalog() -> ApplicationCatalog:
     import consent_store
-    return consent_store.get_db_repository()
+    db = await consent_store.open_repository()
+    catalog = consent_store.get_catalog()
+    if not catalog.loaded:
+        await db.run(catalog.refresh)
+    return catalog
 
 @router.post("", response_model=ApplicationResponse)
-def create_application(app: ApplicationCreate, db: DatabaseRepository = Depends(get_repository)):
+async def create_application(app: ApplicationCreate, db: AsyncDatabaseRepository = Depends(get_repository),
+                             catalog: ApplicationCatalog = Depends(get_catalog)):
     """Register a new application"""
     try:
-        app_id = db.create_application(app.name)
-        app_data = db.get_application(app_id)
+        app_id = await db.create_application(app.name)
+        app_data = await db.get_application(app_id)
+        catalog.application_added(app_data)
         return ApplicationResponse(**app_data)
     except Exception as e:
         if "UNIQUE constraint failed" in str(e):
             raise HTTPException(status_code=409, detail=f"Application '{app.name}' already exists")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("", response_model=List[ApplicationResponse])
-def list_applications(response: Response, db: DatabaseRepository = Depends(get_repository)):
-    """List all applications"""
-    # Add CORS headers directly
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "*"
+@router.get("", response_model=List[Union[ApplicationWithCapabilities, ApplicationResponse]])
+async def list_applications(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include: Optional[Literal["capabilities"]] = None,
+    db: AsyncDatabaseRepository = Depends(get_repository)
+):
+    """List applications by name.
+
+    With limit, return one keyset page and set X-Next-Cursor when more may follow.
+    With Accept: application/x-ndjson, stream every application after the cursor.
+    With include=capabilities, each application carries its capabilities, read
+    in one joined query rather than one request per application.
+    Responses carry an ETag; a matching If-None-Match gets 304 without a query.
+    """
+    import consent_store
+    after = None
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        if not isinstance(after, str):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    etag = make_etag(request, consent_store.get_versions().catalog_version())
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    with_capabilities = include == "capabilities"
+    model = ApplicationWithCapabilities if with_capabilities else ApplicationResponse
+
+    if wants_ndjson(request):
+        if consent_store.FAST_JSON:
+            serialize = lambda app: ndjson_line(app, ("created_at",))
+        else:
+            serialize = lambda app: model(**app).model_dump_json()
+        streaming = ndjson_response(db.iter_applications(after=after, with_capabilities=with_capabilities),
+                                    serialize)
+        set_etag(streaming, etag)
+        return streaming
+
+    set_etag(response, etag)
     
-    apps = db.list_applications()
-    return [ApplicationResponse(**app) for app in apps]
+    if with_capabilities:
+        apps = await db.list_applications_with_capabilities(limit=limit, after=after)
+    else:
+        apps = await db.list_applications(limit=limit, after=after)
+    if limit is not None and len(apps) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(apps[-1]['name'])
+    if consent_store.FAST_JSON:
+        return rows_response(apps, response, ("created_at",))
+    return [model(**app) for app in apps]
 
 @router.get("/{app_id}", response_model=ApplicationWithCapabilities)
-def get_application(app_id: int, db: DatabaseRepository = Depends(get_repository)):
+async def get_application(app_id: int, db: AsyncDatabaseRepository = Depends(get_repository)):
     """Get application details with capabilities"""
-    app = db.get_application(app_id)
+    app = await db.get_application(app_id)
     if not app:
         raise HTTPException(status_code=404, detail="Application not found")
     
-    capabilities = db.list_capabilities(app_id)
+    capabilities = await db.list_capabilities(app_id)
     return ApplicationWithCapabilities(**app, capabilities=capabilities)
 
-@router.delete("/{app_id}", response_model=MessageResponse)
-def delete_application(app_id: int, db: DatabaseRepository = Depends(get_repository)):
-    """Delete an application"""
-    if not db.delete_application(app_id):
+@router.delete("/{app_id}", response_model=MessageResponse, responses={202: {"model": JobStatus}})
+async def delete_application(app_id: int, background: bool = False,
+                             db: AsyncDatabaseRepository = Depends(get_repository),
+                             catalog: ApplicationCatalog = Depends(get_catalog)):
+    """Delete an application.
+
+    The application leaves the catalog at once, so no new grants or checks resolve it.
+    Its consents are then deleted in chunks by a background job before the application
+    row itself; background=true returns 202 with the job instead of waiting. If the job
+    fails, the application is read back into the catalog so it stays usable and the
+    delete can be retried.
+    """
+    import consent_store
+    if not await db.get_application(app_id):
         raise HTTPException(status_code=404, detail="Application not found")
+    catalog.application_deleted(app_id)
+    
+    async def work(job):
+        try:
+            await delete_in_chunks(db, job, consent_store.DELETE_CHUNK_SIZE, consent_store.DELETE_CHUNK_PAUSE,
+                                   app_id=app_id)
+            await db.delete_application(app_id)
+        except Exception:
+            await db.run(catalog.reload_application, app_id)
+            raise
+    
+    job = consent_store.get_job_manager().start("delete_application", work, application_id=app_id)
+    if background:
+        return job_accepted(job)
+    await wait_for_job(job)
     return MessageResponse(message="Application deleted successfully")
 
 @router.put("/{app_id}/capabilities", response_model=MessageResponse)
-def add_capability(app_id: int, capability: CapabilityAdd, db: DatabaseRepository = Depends(get_repository)):
+async def add_capability(app_id: int, capability: CapabilityAdd, db: AsyncDatabaseRepository = Depends(get_repository),
+                         catalog: ApplicationCatalog = Depends(get_catalog)):
     """Add a capability to an application"""
-    app = db.get_application(app_id)
+    app = await db.get_application(app_id)
     if not app:
         raise HTTPException(status_code=404, detail="Application not found")
     
-    if not db.add_capability(app_id, capability.capability):
+    if not await db.add_capability(app_id, capability.capability):
         raise HTTPException(status_code=409, detail="Capability already exists")
+    catalog.capability_added(app_id, capability.capability)
     
     return MessageResponse(message="Capability added successfully")
 
 @router.delete("/{app_id}/capabilities/{capability}", response_model=MessageResponse)
-def remove_capability(app_id: int, capability: str, db: DatabaseRepository = Depends(get_repository)):
+async def remove_capability(app_id: int, capability: str, db: AsyncDatabaseRepository = Depends(get_repository),
+                            catalog: ApplicationCatalog = Depends(get_catalog)):
     """Remove a capability from an application"""
-    if not db.remove_capability(app_id, capability):
+    if not await db.remove_capability(app_id, capability):
         raise HTTPException(status_code=404, detail="Capability not found")
+    catalog.capability_removed(app_id, capability)
     return MessageResponse(message="Capability removed successfully")
 
 @router.get("/{app_id}/capabilities", response_model=List[str])
-def list_capabilities(app_id: int, db: DatabaseRepository = Depends(get_repository)):
+async def list_capabilities(app_id: int, db: AsyncDatabaseRepository = Depends(get_repository)):
     """List all capabilities for an application"""
-    app = db.get_application(app_id)
+    app = await db.get_application(app_id)
     if not app:
         raise HTTPException(status_code=404, detail="Application not found")
     
-    return db.list_capabilities(app_id)
\ No newline at end of file
+    return await db.list_capabilities(app_id)
\ No newline at end of file
@@ -0,0 +1,30 @@
+import zlib
+from fastapi import Request, Response
+from routers.pagination import wants_ndjson
+
+ETAG_HEADER = "ETag"
+# Let clients keep the body but make them revalidate it on every use
+CACHE_CONTROL = "no-cache"
+
+def make_etag(request: Request, version: str) -> str:
+    """Weak ETag for a listing at version, as rendered for this request's query and Accept header"""
+    import consent_store
+    variant = zlib.crc32(f"{request.url.query}|{wants_ndjson(request)}".encode())
+    return f'W/"{consent_store.get_versions().boot_id}-{version}-{variant:08x}"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Whether If-None-Match already names etag (weak comparison, as RFC 9110 requires)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={ETAG_HEADER: etag, "Cache-Control": CACHE_CONTROL})
+
+def set_etag(response: Response, etag: str):
+    response.headers[ETAG_HEADER] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -1,77 +1,182 @@
-from fastapi import APIRouter, HTTPException, Depends, Response
-from typing import List
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Response, Request, Query
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Dict, Any, Tuple, Optional
 from models.schemas import (
     ConsentGrant, ConsentCheck, ConsentCheckResponse, ConsentRevoke,
-    UserConsent, MessageResponse, CountResponse
+    ConsentCheckBatch, ConsentCheckBatchResult, ConsentCheckBatchResponse, ConsentImportResponse,
+    UserConsent, MessageResponse, ConsentGrantResponse, CountResponse, ConsentCacheStats,
+    ConsentChange, ConsentChangesResponse, JobStatus
 )
-from database.repository import DatabaseRepository
+from database.async_repository import AsyncDatabaseRepository
+from database.catalog import ApplicationCatalog
+from database.jobs import delete_in_chunks
+from database.group_commit import GroupCommitWriter
+from routers.admin import job_accepted, wait_for_job
+from routers.pagination import (
+    NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, wants_ndjson, ndjson_response
+)
+from routers.fast_json import rows_response, ndjson_line
+from routers.conditional import make_etag, is_not_modified, not_modified_response, set_etag
 
 router = APIRouter(prefix="/consent", tags=["consent"])
 
-# Add OPTIONS handler for all consent routes
-@router.options("/{path:path}")
-async def consent_options_handler(path: str):
-    """Handle preflight OPTIONS requests for consent routes"""
-    return Response(
-        status_code=200,
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-            "Access-Control-Max-Age": "3600",
-        }
-    )
+async def get_repository() -> AsyncDatabaseRepository:
+    import consent_store
+    return await consent_store.open_repository()
+
+def get_consent_writer() -> Optional[GroupCommitWriter]:
+    import consent_store
+    return consent_store.get_consent_writer()
 
-def get_repository() -> DatabaseRepository:
+async def get_catalog() -> ApplicationCatalog:
     import consent_store
-    return consent_store.get_db_repository()
+    db = await consent_store.open_repository()
+    catalog = consent_store.get_catalog()
+    if not catalog.loaded:
+        await db.run(catalog.refresh)
+    return catalog
 
-@router.post("", response_model=MessageResponse)
-def grant_consent(consent: ConsentGrant, db: DatabaseRepository = Depends(get_repository)):
-    """Record user consent for an application to use another application's capabilities"""
-    # Get application IDs
-    requesting_app = db.get_application_by_name(consent.requesting_app_name)
+def resolve_applications(catalog: ApplicationCatalog, requesting_app_name: str,
+                         destination_app_name: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Look up the requesting and destination applications by name, raising 404 if either is unknown"""
+    requesting_app = catalog.get_application_by_name(requesting_app_name)
     if not requesting_app:
-        raise HTTPException(status_code=404, detail=f"Requesting application '{consent.requesting_app_name}' not found")
+        raise HTTPException(status_code=404, detail=f"Requesting application '{requesting_app_name}' not found")
     
-    destination_app = db.get_application_by_name(consent.destination_app_name)
+    destination_app = catalog.get_application_by_name(destination_app_name)
     if not destination_app:
-        raise HTTPException(status_code=404, detail=f"Destination application '{consent.destination_app_name}' not found")
+        raise HTTPException(status_code=404, detail=f"Destination application '{destination_app_name}' not found")
+    
+    return requesting_app, destination_app
+
+def unknown_capabilities(capabilities: List[str], destination_app_name: str) -> HTTPException:
+    """400 naming every requested capability the destination application does not have"""
+    noun = "Capability" if len(capabilities) == 1 else "Capabilities"
+    names = ", ".join(f"'{capability}'" for capability in capabilities)
+    return HTTPException(status_code=400, detail=f"{noun} {names} not found for application '{destination_app_name}'")
+
+@router.post("", response_model=ConsentGrantResponse)
+async def grant_consent(consent: ConsentGrant, db: AsyncDatabaseRepository = Depends(get_repository)):
+    """Record user consent for an application to use another application's capabilities.
+
+    Granting is idempotent; the response says which capabilities were newly
+    granted and which the user had granted already. If any capability is
+    unknown, nothing is granted.
+    """
+    capabilities = list(dict.fromkeys(consent.capabilities))
+    grant = (consent.user_id, consent.requesting_app_name, consent.destination_app_name, capabilities)
+    writer = get_consent_writer()
+    # Resolves both names, validates and grants in one transaction, shared with other
+    # requests' grants when group commit is on
+    if writer is None:
+        result = await db.grant_consent_by_name(*grant)
+    else:
+        result = await writer.submit_grant_by_name(*grant)
+    if result['requesting_app_id'] is None:
+        raise HTTPException(status_code=404,
+                            detail=f"Requesting application '{consent.requesting_app_name}' not found")
+    if result['destination_app_id'] is None:
+        raise HTTPException(status_code=404,
+                            detail=f"Destination application '{consent.destination_app_name}' not found")
+    if result['unknown']:
+        raise unknown_capabilities(result['unknown'], consent.destination_app_name)
     
-    # Verify capabilities exist for destination app
-    dest_capabilities = db.list_capabilities(destination_app['id'])
+    return ConsentGrantResponse(
+        message="Consent granted successfully",
+        newly_granted=result['newly_granted'],
+        already_granted=result['already_granted']
+    )
+
+# Cap on the number of per-line errors echoed back by /consent/import
+IMPORT_MAX_ERRORS = 100
+
+def parse_import_line(line: bytes, catalog: ApplicationCatalog) -> List[Tuple[str, int, int, str]]:
+    """Turn one NDJSON ConsentGrant line into grant tuples, raising ValueError if it is invalid"""
+    try:
+        consent = ConsentGrant.model_validate_json(line)
+    except ValidationError as e:
+        raise ValueError(f"invalid consent: {e.errors()[0]['msg']}")
+    
+    requesting_app = catalog.get_application_by_name(consent.requesting_app_name)
+    if not requesting_app:
+        raise ValueError(f"requesting application '{consent.requesting_app_name}' not found")
+    destination_app = catalog.get_application_by_name(consent.destination_app_name)
+    if not destination_app:
+        raise ValueError(f"destination application '{consent.destination_app_name}' not found")
+    
+    dest_capabilities = catalog.get_capabilities(destination_app['id'])
     for capability in consent.capabilities:
         if capability not in dest_capabilities:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Capability '{capability}' not found for application '{consent.destination_app_name}'"
-            )
+            raise ValueError(f"capability '{capability}' not found for application '{consent.destination_app_name}'")
     
-    # Grant consent for each capability
-    for capability in consent.capabilities:
-        db.grant_consent(
-            consent.user_id,
-            requesting_app['id'],
-            destination_app['id'],
-            capability
-        )
+    return [
+        (consent.user_id, requesting_app['id'], destination_app['id'], capability)
+        for capability in consent.capabilities
+    ]
+
+@router.post("/import", response_model=ConsentImportResponse)
+async def import_consents(request: Request, chunk_size: int = Query(5000, ge=1, le=100000),
+                          db: AsyncDatabaseRepository = Depends(get_repository),
+                          catalog: ApplicationCatalog = Depends(get_catalog)):
+    """Bulk-import consents from a streamed NDJSON body of ConsentGrant objects, committing every chunk_size grants"""
+    lines = 0
+    granted = 0
+    attempted = 0
+    rejected = 0
+    errors: List[str] = []
+    pending: List[Tuple[str, int, int, str]] = []
+    
+    def handle_line(line: bytes):
+        nonlocal lines, rejected
+        if not line.strip():
+            return
+        lines += 1
+        try:
+            pending.extend(parse_import_line(line, catalog))
+        except ValueError as e:
+            rejected += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append(f"line {lines}: {e}")
+    
+    async def flush():
+        nonlocal granted, attempted
+        chunk = pending[:]
+        pending.clear()
+        attempted += len(chunk)
+        granted += await db.grant_consents_bulk(chunk)
     
-    return MessageResponse(message="Consent granted successfully")
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *complete, buffer = buffer.split(b"\n")
+        for line in complete:
+            handle_line(line)
+            if len(pending) >= chunk_size:
+                await flush()
+    handle_line(buffer)
+    if pending:
+        await flush()
+    
+    return ConsentImportResponse(
+        lines=lines,
+        granted=granted,
+        duplicates=attempted - granted,
+        rejected=rejected,
+        errors=errors
+    )
 
 @router.get("/check", response_model=ConsentCheckResponse)
-def check_consent(consent: ConsentCheck = Depends(), db: DatabaseRepository = Depends(get_repository)):
+async def check_consent(consent: ConsentCheck = Depends(), db: AsyncDatabaseRepository = Depends(get_repository),
+                        catalog: ApplicationCatalog = Depends(get_catalog)):
     """Check if user has granted consent for specific capabilities"""
-    # Get application IDs
-    requesting_app = db.get_application_by_name(consent.requesting_app_name)
-    if not requesting_app:
-        raise HTTPException(status_code=404, detail=f"Requesting application '{consent.requesting_app_name}' not found")
-    
-    destination_app = db.get_application_by_name(consent.destination_app_name)
-    if not destination_app:
-        raise HTTPException(status_code=404, detail=f"Destination application '{consent.destination_app_name}' not found")
+    requesting_app, destination_app = resolve_applications(
+        catalog, consent.requesting_app_name, consent.destination_app_name
+    )
     
     # Check consent
-    granted = db.check_consent(
+    granted = await db.check_consent(
         consent.user_id,
         requesting_app['id'],
         destination_app['id'],
@@ -83,19 +188,15 @@ def check_consent(consent: ConsentCheck = Depends(), db: DatabaseRepository = De
     return ConsentCheckResponse(granted=granted, all_granted=all_granted)
 
 @router.post("/check", response_model=ConsentCheckResponse)
-def check_consent_post(consent: ConsentCheck, db: DatabaseRepository = Depends(get_repository)):
+async def check_consent_post(consent: ConsentCheck, db: AsyncDatabaseRepository = Depends(get_repository),
+                             catalog: ApplicationCatalog = Depends(get_catalog)):
     """Check if user has granted consent for specific capabilities (POST version)"""
-    # Get application IDs
-    requesting_app = db.get_application_by_name(consent.requesting_app_name)
-    if not requesting_app:
-        raise HTTPException(status_code=404, detail=f"Requesting application '{consent.requesting_app_name}' not found")
-    
-    destination_app = db.get_application_by_name(consent.destination_app_name)
-    if not destination_app:
-        raise HTTPException(status_code=404, detail=f"Destination application '{consent.destination_app_name}' not found")
+    requesting_app, destination_app = resolve_applications(
+        catalog, consent.requesting_app_name, consent.destination_app_name
+    )
     
     # Check consent
-    granted = db.check_consent(
+    granted = await db.check_consent(
         consent.user_id,
         requesting_app['id'],
         destination_app['id'],
@@ -106,42 +207,220 @@ def check_consent_post(consent: ConsentCheck, db: DatabaseRepository = Depends(g
     
     return ConsentCheckResponse(granted=granted, all_granted=all_granted)
 
+@router.post("/check/batch", response_model=ConsentCheckBatchResponse)
+async def check_consent_batch(batch: ConsentCheckBatch, db: AsyncDatabaseRepository = Depends(get_repository),
+                              catalog: ApplicationCatalog = Depends(get_catalog)):
+    """Check many consent tuples with a single query, returning results in input order"""
+    results: List[ConsentCheckBatchResult] = [None] * len(batch.items)
+    checks = []
+    positions = []
+    for position, item in enumerate(batch.items):
+        requesting_app = catalog.get_application_by_name(item.requesting_app_name)
+        destination_app = catalog.get_application_by_name(item.destination_app_name)
+        if not requesting_app or not destination_app:
+            missing = item.requesting_app_name if not requesting_app else item.destination_app_name
+            results[position] = ConsentCheckBatchResult(
+                granted={cap: False for cap in item.capabilities},
+                all_granted=False,
+                error=f"Application '{missing}' not found"
+            )
+            continue
+        checks.append((item.user_id, requesting_app['id'], destination_app['id'], item.capabilities))
+        positions.append(position)
+    
+    for position, granted in zip(positions, await db.check_consent_batch(checks)):
+        results[position] = ConsentCheckBatchResult(granted=granted, all_granted=all(granted.values()))
+    
+    return ConsentCheckBatchResponse(results=results)
+
 @router.delete("/user/{user_id}/capability", response_model=MessageResponse)
-def revoke_specific_consent(user_id: str, revoke: ConsentRevoke, db: DatabaseRepository = Depends(get_repository)):
+async def revoke_specific_consent(user_id: str, revoke: ConsentRevoke, db: AsyncDatabaseRepository = Depends(get_repository),
+                                  catalog: ApplicationCatalog = Depends(get_catalog)):
     """Revoke specific consent for a user"""
-    # Get application IDs
-    requesting_app = db.get_application_by_name(revoke.requesting_app_name)
-    if not requesting_app:
-        raise HTTPException(status_code=404, detail=f"Requesting application '{revoke.requesting_app_name}' not found")
-    
-    destination_app = db.get_application_by_name(revoke.destination_app_name)
-    if not destination_app:
-        raise HTTPException(status_code=404, detail=f"Destination application '{revoke.destination_app_name}' not found")
+    requesting_app, destination_app = resolve_applications(
+        catalog, revoke.requesting_app_name, revoke.destination_app_name
+    )
     
-    if not db.revoke_consent(user_id, requesting_app['id'], destination_app['id'], revoke.capability):
+    writer = get_consent_writer()
+    if writer is not None:
+        revoked, = await writer.submit([
+            ('revoke', user_id, requesting_app['id'], destination_app['id'], revoke.capability)
+        ])
+    else:
+        revoked = await db.revoke_consent(user_id, requesting_app['id'], destination_app['id'], revoke.capability)
+    if not revoked:
         raise HTTPException(status_code=404, detail="Consent not found")
     
     return MessageResponse(message="Consent revoked successfully")
 
-@router.delete("/user/{user_id}", response_model=CountResponse)
-def revoke_all_user_consent(user_id: str, db: DatabaseRepository = Depends(get_repository)):
-    """Clear all consent for a specific user"""
-    count = db.revoke_all_user_consent(user_id)
-    return CountResponse(count=count)
+@router.delete("/user/{user_id}", response_model=CountResponse, responses={202: {"model": JobStatus}})
+async def revoke_all_user_consent(user_id: str, background: bool = False,
+                                  db: AsyncDatabaseRepository = Depends(get_repository)):
+    """Clear all consent for a specific user.
 
-@router.delete("/all", response_model=CountResponse)
-def revoke_all_consent(db: DatabaseRepository = Depends(get_repository)):
-    """Clear all consent in the system"""
-    count = db.revoke_all_consent()
-    return CountResponse(count=count)
+    Rows are deleted in chunks by a background job. The request waits for it unless
+    background=true, which returns 202 with the job to poll at /admin/jobs/{id}.
+    """
+    import consent_store
+    
+    async def work(job):
+        await delete_in_chunks(db, job, consent_store.DELETE_CHUNK_SIZE, consent_store.DELETE_CHUNK_PAUSE,
+                               user_id=user_id)
+        job.deleted += await db.revoke_all_user_consent(user_id)
+    
+    job = consent_store.get_job_manager().start("revoke_user", work, user_id=user_id)
+    if background:
+        return job_accepted(job)
+    await wait_for_job(job)
+    return CountResponse(count=job.deleted)
+
+@router.delete("/all", response_model=CountResponse, responses={202: {"model": JobStatus}})
+async def revoke_all_consent(background: bool = False, db: AsyncDatabaseRepository = Depends(get_repository)):
+    """Clear all consent in the system, in chunks, like DELETE /consent/user/{user_id}"""
+    import consent_store
+    
+    async def work(job):
+        await delete_in_chunks(db, job, consent_store.DELETE_CHUNK_SIZE, consent_store.DELETE_CHUNK_PAUSE)
+        job.deleted += await db.revoke_all_consent()
+    
+    job = consent_store.get_job_manager().start("revoke_all", work)
+    if background:
+        return job_accepted(job)
+    await wait_for_job(job)
+    return CountResponse(count=job.deleted)
+
+@router.get("/cache/stats", response_model=ConsentCacheStats)
+async def consent_cache_stats():
+    """Report hit, miss and eviction counters of the consent decision cache"""
+    import consent_store
+    # The cache is created with the repository, so open it off the event loop first
+    await consent_store.open_repository()
+    cache = consent_store.get_consent_cache()
+    if cache is None:
+        return ConsentCacheStats(enabled=False)
+    return ConsentCacheStats(enabled=True, **cache.stats())
+
+@router.get("/changes", response_model=ConsentChangesResponse)
+async def list_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    timeout: float = Query(30, ge=0, le=300),
+    db: AsyncDatabaseRepository = Depends(get_repository)
+):
+    """Return consent changes with a sequence number above since.
+
+    As JSON this is a long poll: with nothing new it waits up to timeout seconds
+    for a change. Without since it returns the current sequence number to start
+    from. With Accept: text/event-stream the changes are pushed as Server-Sent
+    Events, resuming from Last-Event-ID on reconnect.
+    """
+    import consent_store
+    notifier = consent_store.get_change_notifier()
+    poll_interval = consent_store.CHANGES_POLL_INTERVAL
+    
+    if "text/event-stream" in request.headers.get("accept", ""):
+        last_event_id = request.headers.get("last-event-id")
+        if last_event_id is not None:
+            if not last_event_id.isdigit():
+                raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+            since = int(last_event_id)
+        if since is None:
+            since = await db.last_change_seq()
+        return StreamingResponse(
+            change_events(request, db, since, limit),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    if since is None:
+        return ConsentChangesResponse(changes=[], last_seq=await db.last_change_seq())
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        changes = await db.list_changes(since, limit)
+        remaining = deadline - loop.time()
+        if changes or remaining <= 0:
+            break
+        await notifier.wait(min(remaining, poll_interval))
+    
+    return ConsentChangesResponse(
+        changes=[ConsentChange(**change) for change in changes],
+        last_seq=changes[-1]['seq'] if changes else since
+    )
+
+async def change_events(request: Request, db: AsyncDatabaseRepository, since: int, limit: int):
+    """Yield Server-Sent Events for every change after since until the client disconnects"""
+    import consent_store
+    notifier = consent_store.get_change_notifier()
+    loop = asyncio.get_running_loop()
+    last_sent = loop.time()
+    # Tell the client where the stream starts, so it can resume even if nothing changes
+    yield f"retry: 1000\nid: {since}\n\n"
+    while not await request.is_disconnected():
+        changes = await db.list_changes(since, limit)
+        for change in changes:
+            yield f"id: {change['seq']}\nevent: change\ndata: {ConsentChange(**change).model_dump_json()}\n\n"
+        if changes:
+            since = changes[-1]['seq']
+            last_sent = loop.time()
+            if len(changes) == limit:
+                continue
+        elif loop.time() - last_sent >= consent_store.CHANGES_HEARTBEAT_INTERVAL:
+            # Comment lines keep proxies from closing an idle stream
+            yield ": keep-alive\n\n"
+            last_sent = loop.time()
+        await notifier.wait(consent_store.CHANGES_POLL_INTERVAL)
+
+def decode_consent_cursor(cursor: str) -> Tuple[str, int]:
+    after = decode_cursor(cursor)
+    if (not isinstance(after, list) or len(after) != 2
+            or not isinstance(after[0], str) or not isinstance(after[1], int)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after[0], after[1]
 
 @router.get("/user/{user_id}", response_model=List[UserConsent])
-def list_user_consents(user_id: str, response: Response, db: DatabaseRepository = Depends(get_repository)):
-    """List all consents for a specific user"""
-    # Add CORS headers directly
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "*"
-    
-    consents = db.list_user_consents(user_id)
+async def list_user_consents(
+    user_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncDatabaseRepository = Depends(get_repository)
+):
+    """List consents for a specific user, newest first.
+
+    With limit, return one keyset page and set X-Next-Cursor when more may follow.
+    With Accept: application/x-ndjson, stream every consent after the cursor.
+    Responses carry an ETag; a matching If-None-Match gets 304 without a query.
+    """
+    import consent_store
+    after = decode_consent_cursor(cursor) if cursor is not None else None
+
+    versions = consent_store.get_versions()
+    version = versions.cached_user_version(user_id)
+    if version is None:
+        version = await db.run(versions.user_version, user_id)
+    etag = make_etag(request, version)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    if wants_ndjson(request):
+        if consent_store.FAST_JSON:
+            serialize = lambda consent: ndjson_line(consent, ("granted_at",))
+        else:
+            serialize = lambda consent: UserConsent(**consent).model_dump_json()
+        streaming = ndjson_response(db.iter_user_consents(user_id, after=after), serialize)
+        set_etag(streaming, etag)
+        return streaming
+
+    set_etag(response, etag)
+    
+    consents = await db.list_user_consents(user_id, limit=limit, after=after)
+    if limit is not None and len(consents) == limit:
+        last = consents[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([last['granted_at'], last['id']])
+    if consent_store.FAST_JSON:
+        return rows_response(consents, response, ("granted_at",))
     return [UserConsent(**consent) for consent in consents]
\ No newline at end of file
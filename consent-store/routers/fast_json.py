@@ -0,0 +1,29 @@
+import orjson
+from typing import Any, Dict, List, Sequence
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+def iso_timestamp(value: Any) -> Any:
+    """Render a SQLite 'YYYY-MM-DD HH:MM:SS' timestamp the way Pydantic serializes a datetime"""
+    return value.replace(" ", "T", 1) if isinstance(value, str) else value
+
+def encode_row(row: Dict[str, Any], timestamp_fields: Sequence[str]) -> Dict[str, Any]:
+    """Return a copy of row with its timestamps rendered; the caller's row may still be in use,
+    e.g. as the keyset cursor of the next page"""
+    return {**row, **{field: iso_timestamp(row[field]) for field in timestamp_fields}}
+
+def rows_response(rows: List[Dict[str, Any]], response: Response,
+                  timestamp_fields: Sequence[str] = ()) -> ORJSONResponse:
+    """Encode repository rows with orjson as they are, skipping response_model validation.
+
+    Headers already set on the route's response parameter are carried over,
+    since FastAPI does not merge them into a returned Response.
+    """
+    fast = ORJSONResponse([encode_row(row, timestamp_fields) for row in rows])
+    for name, value in response.headers.items():
+        if name != "content-length":
+            fast.headers[name] = value
+    return fast
+
+def ndjson_line(row: Dict[str, Any], timestamp_fields: Sequence[str] = ()) -> str:
+    return orjson.dumps(encode_row(row, timestamp_fields)).decode()
@@ -0,0 +1,30 @@
+import base64
+import json
+from typing import Any, AsyncIterator, Callable, Dict
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(value: Any) -> str:
+    """Encode a keyset position as an opaque URL-safe cursor"""
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Any:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def ndjson_response(rows: AsyncIterator[Dict[str, Any]], serialize: Callable[[Dict[str, Any]], str]) -> StreamingResponse:
+    """Stream rows as newline-delimited JSON without collecting them first"""
+    async def lines():
+        async for row in rows:
+            yield serialize(row) + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
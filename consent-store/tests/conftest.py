@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# consent_store imports config from the repository root
+sys.path[:0] = [os.path.dirname(HERE), os.path.dirname(os.path.dirname(HERE))]
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    """A TestClient for consent-store, with its database files in a temporary directory"""
+    from fastapi.testclient import TestClient
+    os.chdir(tmp_path_factory.mktemp("consent-store"))
+    import consent_store
+    with TestClient(consent_store.app) as test_client:
+        yield test_client
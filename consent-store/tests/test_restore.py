@@ -0,0 +1,23 @@
+import gzip
+
+def test_truncated_restore_keeps_existing_data(client):
+    requesting = client.post("/applications", json={"name": "restore-requesting"}).json()
+    destination = client.post("/applications", json={"name": "restore-destination"}).json()
+    client.put(f"/applications/{destination['id']}/capabilities", json={"capability": "read"})
+    client.post("/consent", json={
+        "user_id": "restore-user",
+        "requesting_app_name": requesting["name"],
+        "destination_app_name": destination["name"],
+        "capabilities": ["read"]
+    })
+    snapshot = client.get("/admin/export").content
+    assert b"restore-user" in gzip.decompress(snapshot)
+
+    response = client.post("/admin/restore", content=snapshot[:len(snapshot) // 2])
+    assert response.status_code == 400
+    assert client.get("/consent/user/restore-user").json()[0]["capability"] == "read"
+
+    response = client.post("/admin/restore", content=snapshot)
+    assert response.status_code == 200
+    assert response.json()["rejected"] == 0
+    assert client.get("/consent/user/restore-user").json()[0]["capability"] == "read"
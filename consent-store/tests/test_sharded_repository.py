@@ -0,0 +1,39 @@
+import pytest
+
+from database.sharded_sqlite_repository import ShardedSQLiteRepository
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = ShardedSQLiteRepository(str(tmp_path / "consent_store.db"), shards=3)
+    yield repository
+    repository.close()
+
+def test_bulk_grants_skip_unknown_capabilities(repository):
+    requesting = repository.create_application("requesting")
+    destination = repository.create_application("destination")
+    repository.add_capability(destination, "read")
+    granted = repository.grant_consents_bulk([
+        ("u", requesting, destination, "read"),
+        ("u", requesting, destination, "nope"),
+        ("u", 9999, destination, "read"),
+    ])
+    assert granted == 1
+    assert repository.apply_consent_writes([("grant", "v", requesting, destination, "nope")]) == [False]
+    assert repository.list_granted_capabilities("u", requesting, destination) == {"read"}
+
+def test_iter_user_consents_skips_orphans_without_stopping_early(repository):
+    requesting = repository.create_application("requesting")
+    gone = repository.create_application("gone")
+    kept = repository.create_application("kept")
+    repository.add_capability(gone, "read")
+    for i in range(30):
+        repository.add_capability(kept, f"cap-{i}")
+    repository.grant_consents_bulk([("u", requesting, kept, f"cap-{i}") for i in range(30)])
+    # Newer grants whose application vanished from the catalog without its shard rows
+    repository.grant_consents_bulk([("u", requesting, gone, "read")])
+    repository.catalog.delete_application(gone)
+
+    page = repository.list_user_consents("u", limit=10)
+    assert len(page) == 10
+    consents = list(repository.iter_user_consents("u", page_size=10))
+    assert sorted(consent["capability"] for consent in consents) == sorted(f"cap-{i}" for i in range(30))
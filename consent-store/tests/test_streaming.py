@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+def create_pair(client, prefix: str, capabilities: int):
+    requesting = client.post("/applications", json={"name": f"{prefix}-requesting"}).json()
+    destination = client.post("/applications", json={"name": f"{prefix}-destination"}).json()
+    for i in range(capabilities):
+        client.put(f"/applications/{destination['id']}/capabilities", json={"capability": f"cap-{i}"})
+    return requesting, destination
+
+@pytest.mark.parametrize("fast_json", [True, False])
+def test_ndjson_consent_stream_spans_pages(client, monkeypatch, fast_json):
+    import consent_store
+    monkeypatch.setattr(consent_store, "FAST_JSON", fast_json)
+    user_id = f"stream-user-{fast_json}"
+    requesting, destination = create_pair(client, f"stream-{fast_json}", 1200)
+    response = client.post("/consent", json={
+        "user_id": user_id,
+        "requesting_app_name": requesting["name"],
+        "destination_app_name": destination["name"],
+        "capabilities": [f"cap-{i}" for i in range(1200)]
+    })
+    assert response.status_code == 200
+
+    # iter_user_consents reads 500 rows per page, so this crosses two page boundaries
+    response = client.get(f"/consent/user/{user_id}", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 1200
+    assert len({row["id"] for row in rows}) == 1200
+    assert {row["capability"] for row in rows} == {f"cap-{i}" for i in range(1200)}
+    assert all("T" in row["granted_at"] for row in rows)
@@ -62,18 +62,10 @@ export function UserConsent() {
 
   const fetchApplications = async () => {
     try {
-      const response = await fetch(`${config.consentStoreUrl}/applications`)
+      // One request returns every application with its capabilities
+      const response = await fetch(`${config.consentStoreUrl}/applications?include=capabilities`)
       if (response.ok) {
-        const apps = await response.json()
-        // Fetch capabilities for each app
-        const appsWithCapabilities = await Promise.all(
-          apps.map(async (app: any) => {
-            const capResponse = await fetch(`${config.consentStoreUrl}/applications/${app.id}/capabilities`)
-            const capabilities = capResponse.ok ? await capResponse.json() : []
-            return { ...app, capabilities }
-          })
-        )
-        setApplications(appsWithCapabilities)
+        setApplications(await response.json())
       }
     } catch (err) {
       console.error('Error fetching applications:', err)
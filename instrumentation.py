@@ -0,0 +1,224 @@
+"""
+Shared request, downstream call and database metrics for the Python services.
+Mounted next to config.py in each container; call instrument(app) to record
+every request and serve /metrics in the Prometheus text format.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Starlette appends "; charset=utf-8" to text/ media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+class Metric(ABC):
+    """Base for metrics whose values are kept in one shard per recording thread.
+
+    A thread only ever writes its own shard, so recording takes no lock; the
+    lock is only taken when a thread records for the first time. Scrapes add
+    the shards up.
+    """
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Dict[Tuple[str, ...], list]] = []
+        REGISTRY.register(self)
+
+    def _shard(self) -> Dict[Tuple[str, ...], list]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _merged(self) -> Dict[Tuple[str, ...], list]:
+        with self._lock:
+            shards = list(self._shards)
+        merged: Dict[Tuple[str, ...], list] = {}
+        for shard in shards:
+            for labels, cells in list(shard.items()):
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(cells)
+                else:
+                    for i, value in enumerate(cells):
+                        total[i] += value
+        return merged
+
+    def _series(self, suffix: str, labels: Tuple[str, ...], value, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(v)}"' for name, v in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        label_text = "{" + ",".join(pairs) + "}" if pairs else ""
+        return f"{self.name}{suffix}{label_text} {_format(value)}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, cells in sorted(self._merged().items()):
+            lines.extend(self._render_series(labels, cells))
+        return lines
+
+    @abstractmethod
+    def _render_series(self, labels: Tuple[str, ...], cells: list) -> List[str]:
+        pass
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        shard = self._shard()
+        cells = shard.get(labels)
+        if cells is None:
+            # One cell per bucket, one for +Inf, then the sum
+            cells = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        cells[bisect_left(self.buckets, value)] += 1
+        cells[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def _render_series(self, labels: Tuple[str, ...], cells: list) -> List[str]:
+        lines = []
+        count = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), cells):
+            count += bucket_count
+            le = "+Inf" if bound == float("inf") else _format(bound)
+            lines.append(self._series("_bucket", labels, count, f'le="{le}"'))
+        lines.append(self._series("_sum", labels, cells[-1]))
+        lines.append(self._series("_count", labels, count))
+        return lines
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1):
+        shard = self._shard()
+        cells = shard.get(labels)
+        if cells is None:
+            cells = shard[labels] = [0]
+        cells[0] += amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def _render_series(self, labels: Tuple[str, ...], cells: list) -> List[str]:
+        return [self._series("", labels, cells[0])]
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle an HTTP request, by method, route template and status (_count is the request count)",
+    ["method", "route", "status"]
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+DOWNSTREAM_SECONDS = Histogram(
+    "downstream_request_duration_seconds",
+    "Time spent calling another service, by target and status",
+    ["target", "status"]
+)
+DB_SECONDS = Histogram(
+    "db_call_duration_seconds",
+    "Time spent in a repository call on a database thread, by operation",
+    ["operation"]
+)
+
+class DownstreamCall:
+    status = "error"
+
+@contextmanager
+def downstream(target: str):
+    """Time a call to another service. Set .status on the yielded object once a response
+    arrives; calls that raise are recorded with status "error"."""
+    call = DownstreamCall()
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        DOWNSTREAM_SECONDS.observe(time.perf_counter() - started, target, str(call.status))
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording REQUEST_SECONDS and REQUESTS_IN_FLIGHT.
+
+    The route label is the matched route's path template, so path parameters
+    do not create new series; requests that match no route share "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status)
+            )
+
+def instrument(app):
+    """Record every request to app and serve the registry at GET /metrics"""
+    from starlette.responses import Response
+
+    async def metrics(request):
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
@@ -18,6 +18,7 @@ from config import (
     FRONTEND_EXTERNAL_URL,
     SERVICE_A_PORT
 )
+import instrumentation
 
 app = FastAPI(
     title="Service A",
@@ -42,6 +43,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request and downstream call metrics at /metrics
+instrumentation.instrument(app)
+
 # Security scheme
 security = HTTPBearer()
 
@@ -109,11 +113,13 @@ async def exchange_token_for_audience(user_token: str, target_audience: str) ->
             
             print(f"Attempting token exchange for audience: {target_audience}")
             
-            response = await client.post(
-                token_endpoint,
-                data=exchange_data,
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
+            with instrumentation.downstream("keycloak_token") as call:
+                response = await client.post(
+                    token_endpoint,
+                    data=exchange_data,
+                    headers={"Content-Type": "application/x-www-form-urlencoded"}
+                )
+                call.status = response.status_code
             
             if response.status_code == 200:
                 token_data = response.json()
@@ -131,11 +137,13 @@ async def exchange_token_for_audience(user_token: str, target_audience: str) ->
                     "scope": "openid"
                 }
                 
-                response = await client.post(
-                    token_endpoint,
-                    data=service_token_data,
-                    headers={"Content-Type": "application/x-www-form-urlencoded"}
-                )
+                with instrumentation.downstream("keycloak_token") as call:
+                    response = await client.post(
+                        token_endpoint,
+                        data=service_token_data,
+                        headers={"Content-Type": "application/x-www-form-urlencoded"}
+                    )
+                    call.status = response.status_code
                 
                 if response.status_code == 200:
                     # For now, return None to indicate we couldn't exchange
@@ -163,10 +171,12 @@ async def check_consent(user_id: str, capability: str) -> bool:
             
             print(f"Checking consent with data: {consent_data}")
             
-            response = await client.post(
-                f"{CONSENT_STORE_URL}/consent/check",
-                json=consent_data
-            )
+            with instrumentation.downstream("consent_check") as call:
+                response = await client.post(
+                    f"{CONSENT_STORE_URL}/consent/check",
+                    json=consent_data
+                )
+                call.status = response.status_code
             
             print(f"Consent check response: {response.status_code} - {response.text}")
             
@@ -242,10 +252,12 @@ async def withdraw(user_info: dict = Depends(get_user_info)):
     # Call banking service with exchanged token
     async with httpx.AsyncClient() as client:
         try:
-            response = await client.post(
-                f"{BANKING_SERVICE_URL}/withdraw",
-                headers={"Authorization": f"Bearer {exchanged_token}"}
-            )
+            with instrumentation.downstream("banking_withdraw") as call:
+                response = await client.post(
+                    f"{BANKING_SERVICE_URL}/withdraw",
+                    headers={"Authorization": f"Bearer {exchanged_token}"}
+                )
+                call.status = response.status_code
             
             if response.status_code == 200:
                 return {